@@ -0,0 +1,208 @@
+import sys
+import uuid
+from array import array
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional
+import numpy as np
+from DS.Detection import Detection
+from DS.timestamps import from_micros, to_micros
+
+_LOW_64 = (1 << 64) - 1
+
+CATEGORICAL_FIELDS = ("tpms_id", "tpms_model", "car_model", "location")
+FLOAT_FIELDS = ("latitude", "longitude", "signal_strength")
+
+
+class Categories:
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        """
+        Integer codes for the distinct values of a string column. Codes are assigned
+        in order of first appearance and never change.
+        """
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+
+    def encode(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            if type(value) is str:
+                value = sys.intern(value)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class ColumnarReadings:
+    def __init__(self, detections: Optional[List[Detection]] = None):
+        """
+        Compact, column-oriented alternative to Readings with the same add / search /
+        iteration API.
+
+        Every field is stored in a typed array instead of one Python object per
+        detection: the UUID as two uint64 columns, the timestamp as int64
+        microseconds since the epoch (timezone-aware values are stored as naive UTC),
+        coordinates and signal strength as float64 (None as NaN), and tpms_id,
+        tpms_model, car_model and location as int32 codes into per-column Categories,
+        each with a uint32 position list per code. A detection costs 80 bytes of
+        column data instead of several hundred bytes of objects and index entries.
+
+        Detection objects are only built for search results and during iteration.
+        """
+        self._id_hi = array("Q")
+        self._id_lo = array("Q")
+        self._timestamps = array("q")
+        self._floats: Dict[str, array] = {field: array("d") for field in FLOAT_FIELDS}
+        self._codes: Dict[str, array] = {field: array("i") for field in CATEGORICAL_FIELDS}
+        self.categories: Dict[str, Categories] = {field: Categories() for field in CATEGORICAL_FIELDS}
+        # Rows holding each code, per categorical field: 4 bytes per detection and field.
+        self._positions: Dict[str, List[array]] = {field: [] for field in CATEGORICAL_FIELDS}
+        for detection in detections or []:
+            self.add(detection)
+
+    def add(self, detection: Detection):
+        """
+        Append a Detection; only its field values are kept.
+        """
+        id_int = detection.id.int
+        self._id_hi.append(id_int >> 64)
+        self._id_lo.append(id_int & _LOW_64)
+        self._timestamps.append(to_micros(detection.timestamp))
+        for field in FLOAT_FIELDS:
+            value = getattr(detection, field)
+            self._floats[field].append(np.nan if value is None else value)
+        row = len(self._timestamps) - 1
+        for field in CATEGORICAL_FIELDS:
+            code = self.categories[field].encode(getattr(detection, field))
+            self._codes[field].append(code)
+            positions = self._positions[field]
+            if code == len(positions):
+                positions.append(array("I"))
+            positions[code].append(row)
+
+    def _detection(self, i: int) -> Detection:
+        floats = {}
+        for field in FLOAT_FIELDS:
+            value = self._floats[field][i]
+            floats[field] = None if value != value else value
+        return Detection(
+            timestamp=from_micros(self._timestamps[i]),
+            id=uuid.UUID(int=(self._id_hi[i] << 64) | self._id_lo[i]),
+            **{field: self.categories[field].values[self._codes[field][i]] for field in CATEGORICAL_FIELDS},
+            **floats,
+        )
+
+    def _matches(self, key: str, value: Any, rows: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Boolean mask over `rows` of the rows where `key` equals `value`; None if no row
+        can match.
+        """
+        if key == "id":
+            if not isinstance(value, uuid.UUID):
+                return None
+            return (np.frombuffer(self._id_hi, dtype=np.uint64)[rows] == np.uint64(value.int >> 64)) & \
+                (np.frombuffer(self._id_lo, dtype=np.uint64)[rows] == np.uint64(value.int & _LOW_64))
+        if key in self.categories:
+            code = self.categories[key].codes.get(value)
+            if code is None:
+                return None
+            return np.frombuffer(self._codes[key], dtype=np.int32)[rows] == code
+        if key == "timestamp":
+            if not isinstance(value, datetime):
+                return None
+            return np.frombuffer(self._timestamps, dtype=np.int64)[rows] == to_micros(value)
+        if key in self._floats:
+            column = np.frombuffer(self._floats[key], dtype=np.float64)[rows]
+            return np.isnan(column) if value is None else column == value
+        # Unknown attributes read as None, as they do for Readings.
+        return np.ones(len(rows), dtype=bool) if value is None else None
+
+    def search(self, since: Optional[datetime] = None, until: Optional[datetime] = None, **kwargs) -> List[Detection]:
+        """
+        Search detections using key=value parameters (exact matches) and an optional
+        since <= timestamp <= until window, like Readings.search. Results are sorted
+        by timestamp.
+
+        The scan starts from the shortest position list among the categorical keys
+        given, or from all rows, and the other keys are checked with numpy on those
+        rows only.
+        """
+        postings = []
+        for key in CATEGORICAL_FIELDS:
+            if key in kwargs:
+                code = self.categories[key].codes.get(kwargs[key])
+                if code is None:
+                    return []
+                postings.append(self._positions[key][code])
+        if postings:
+            rows = np.frombuffer(min(postings, key=len), dtype=np.uint32).astype(np.intp)
+        else:
+            rows = np.arange(len(self))
+        for key, value in kwargs.items():
+            if not len(rows):
+                return []
+            matches = self._matches(key, value, rows)
+            if matches is None:
+                return []
+            rows = rows[matches]
+        timestamps = np.frombuffer(self._timestamps, dtype=np.int64)[rows]
+        if since is not None or until is not None:
+            in_window = np.ones(len(rows), dtype=bool)
+            if since is not None:
+                in_window &= timestamps >= to_micros(since)
+            if until is not None:
+                in_window &= timestamps <= to_micros(until)
+            rows, timestamps = rows[in_window], timestamps[in_window]
+        ordered = rows[np.argsort(timestamps, kind="stable")]
+        return [self._detection(int(i)) for i in ordered]
+
+    def __iter__(self) -> Iterator[Detection]:
+        return (self._detection(i) for i in range(len(self)))
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._detection(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("reading index out of range")
+        return self._detection(index)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """
+        Returns the list of detections as dictionaries.
+        """
+        return [d.to_dict() for d in self]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Size figures in the shape of Readings.stats (compact readings have no retention).
+        """
+        timestamps = np.frombuffer(self._timestamps, dtype=np.int64)
+        return {
+            "count": len(self),
+            "evicted": 0,
+            "max_count": None,
+            "max_age_seconds": None,
+            "oldest": from_micros(int(timestamps.min())) if len(self) else None,
+            "newest": from_micros(int(timestamps.max())) if len(self) else None,
+            "approx_bytes": self.nbytes,
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory held by the columns and position lists (not counting the
+        distinct strings).
+        """
+        columns = [self._id_hi, self._id_lo, self._timestamps, *self._floats.values(), *self._codes.values()]
+        columns += [positions for field in CATEGORICAL_FIELDS for positions in self._positions[field]]
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
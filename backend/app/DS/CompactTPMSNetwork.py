@@ -0,0 +1,356 @@
+"""
+CompactTPMSNetwork.py
+
+Array-backed alternative to TPMSNetwork for very large event histories.
+
+TPMSNetwork keeps every event as a networkx node with an attribute dict and its edges
+as dict-of-dict adjacency, which costs kilobytes per event. CompactTPMSNetwork keeps
+the same information in typed columns:
+
+    timestamp          int64 microseconds since the epoch (aware values as naive UTC)
+    latitude/longitude float64
+    battery/signal     float32
+    location/car/model int32 codes into string tables
+    predecessor        int32 node id of the previous event of the same car (-1: none)
+    tire ids           int32 codes, stored flat with an int32 offset per event
+
+and each tire's events as an int32 array of node ids in timestamp order. That is
+about 60 bytes per single-tire event, so 10M events fit in roughly 600 MB.
+
+The event API matches TPMSNetwork (add_event, search_by_tire, search_by_tire_ids,
+get_path_for_node, get_path_by_tire, get_path_coordinates, get_path_details,
+search_event, to_dict/from_dict), including node ids. There is no networkx `graph`
+attribute; use to_dict() where a graph representation is needed.
+"""
+
+from array import array
+from datetime import datetime
+from typing import List, Tuple, Dict, Optional, Any
+import numpy as np
+from DS.ColumnarReadings import Categories
+from DS.timestamps import from_micros, to_micros
+
+NO_PREDECESSOR = -1
+
+
+class CompactTPMSNetwork:
+    def __init__(self):
+        """
+        Initialize an empty array-backed TPMS network.
+        """
+        self.next_node_id: int = 0
+        self._timestamps = array("q")
+        self._latitudes = array("d")
+        self._longitudes = array("d")
+        self._batteries = array("f")
+        self._signals = array("f")
+        self._locations = array("i")
+        self._descriptions = array("i")
+        self._tire_models = array("i")
+        self._predecessors = array("i")
+        # Tire codes of node n are _tire_codes[_tire_offsets[n]:_tire_offsets[n + 1]].
+        self._tire_offsets = array("i", [0])
+        self._tire_codes = array("i")
+        self._location_table = Categories()
+        self._description_table = Categories()
+        self._tire_model_table = Categories()
+        self._tire_table = Categories()
+        # Node ids per tire code, in timestamp order.
+        self._tire_nodes: List[array] = []
+
+    def add_event(self,
+                  timestamp: datetime,
+                  location: str,
+                  latitude: float,
+                  longitude: float,
+                  battery: float,
+                  signal_strength: float,
+                  tire_ids: List[str],
+                  car_description: str = "",
+                  tire_model: Optional[str] = None) -> int:
+        """
+        Add an event (a detection of a vehicle) to the network and link it to the
+        latest earlier event sharing a tire ID, like TPMSNetwork.add_event.
+
+        Returns:
+            int: A unique node ID representing this event.
+        """
+        if not isinstance(timestamp, datetime):
+            raise TypeError("timestamp must be a datetime object")
+        if not isinstance(tire_ids, list) or not tire_ids:
+            raise ValueError("tire_ids must be a non-empty list")
+        if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+            raise TypeError("latitude and longitude must be numeric")
+
+        node_id = self.next_node_id
+        self.next_node_id += 1
+        micros = to_micros(timestamp)
+        tire_codes = [self._tire_table.encode(tid) for tid in tire_ids]
+
+        prev_node = self._find_latest_event_for_car(tire_codes, micros)
+
+        self._timestamps.append(micros)
+        self._latitudes.append(latitude)
+        self._longitudes.append(longitude)
+        self._batteries.append(battery if battery is not None else np.nan)
+        self._signals.append(signal_strength if signal_strength is not None else np.nan)
+        self._locations.append(self._location_table.encode(location))
+        self._descriptions.append(self._description_table.encode(car_description))
+        self._tire_models.append(self._tire_model_table.encode(tire_model))
+        self._predecessors.append(prev_node if prev_node is not None else NO_PREDECESSOR)
+        self._tire_codes.extend(tire_codes)
+        self._tire_offsets.append(len(self._tire_codes))
+
+        for code in tire_codes:
+            self._index_tire(code, node_id, micros)
+        return node_id
+
+    def _index_tire(self, code: int, node_id: int, micros: int):
+        if code == len(self._tire_nodes):
+            self._tire_nodes.append(array("i"))
+        nodes = self._tire_nodes[code]
+        if not nodes or micros >= self._timestamps[nodes[-1]]:
+            nodes.append(node_id)
+        else:
+            nodes.insert(self._bisect(nodes, micros, right=True), node_id)
+
+    def _bisect(self, nodes: array, micros: int, right: bool) -> int:
+        # Binary search over a tire's node ids by their timestamps.
+        lo, hi = 0, len(nodes)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._timestamps[nodes[mid]]
+            if value < micros or (right and value == micros):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find_latest_event_for_car(self,
+                                   tire_codes: List[int],
+                                   current_micros: int,
+                                   time_threshold_seconds: int = 3600) -> Optional[int]:
+        """
+        Find the most recent earlier event sharing a tire, in O(1) per tire for
+        in-order events and O(log n) for out-of-order ones.
+        """
+        candidate: Optional[int] = None
+        candidate_time: Optional[int] = None
+        for code in tire_codes:
+            if code >= len(self._tire_nodes) or not self._tire_nodes[code]:
+                continue
+            nodes = self._tire_nodes[code]
+            if self._timestamps[nodes[-1]] < current_micros:
+                pos = len(nodes)
+            else:
+                pos = self._bisect(nodes, current_micros, right=False)
+            if pos == 0:
+                continue
+            node = nodes[pos - 1]
+            if candidate is None or self._timestamps[node] > candidate_time:
+                candidate = node
+                candidate_time = self._timestamps[node]
+
+        if candidate_time is not None and current_micros - candidate_time > time_threshold_seconds * 1_000_000:
+            return None
+        return candidate
+
+    def _tire_ids(self, node_id: int) -> List[str]:
+        start, stop = self._tire_offsets[node_id], self._tire_offsets[node_id + 1]
+        return [self._tire_table.values[code] for code in self._tire_codes[start:stop]]
+
+    def _node_data(self, node_id: int) -> Dict[str, Any]:
+        battery = self._batteries[node_id]
+        signal = self._signals[node_id]
+        return {
+            'timestamp': from_micros(self._timestamps[node_id]),
+            'location': self._location_table.values[self._locations[node_id]],
+            'latitude': self._latitudes[node_id],
+            'longitude': self._longitudes[node_id],
+            'battery': None if battery != battery else battery,
+            'signal_strength': None if signal != signal else signal,
+            'tire_ids': self._tire_ids(node_id),
+            'car_description': self._description_table.values[self._descriptions[node_id]],
+            'tire_model': self._tire_model_table.values[self._tire_models[node_id]],
+        }
+
+    def __contains__(self, node_id: int) -> bool:
+        return isinstance(node_id, int) and 0 <= node_id < self.next_node_id
+
+    def __len__(self):
+        return self.next_node_id
+
+    def number_of_edges(self) -> int:
+        return int(np.count_nonzero(np.frombuffer(self._predecessors, dtype=np.int32) != NO_PREDECESSOR))
+
+    def search_by_tire(self,
+                       tire_id: str,
+                       since: Optional[datetime] = None,
+                       until: Optional[datetime] = None) -> List[int]:
+        """
+        Return the node IDs where this tire was detected, sorted by timestamp,
+        optionally only those with since <= timestamp <= until.
+        """
+        code = self._tire_table.codes.get(tire_id)
+        if code is None:
+            return []
+        nodes = self._tire_nodes[code]
+        if since is None and until is None:
+            return nodes.tolist()
+        # The tire's nodes are kept in timestamp order, so a time window is two bisections.
+        start = self._bisect(nodes, to_micros(since), right=False) if since is not None else 0
+        stop = self._bisect(nodes, to_micros(until), right=True) if until is not None else len(nodes)
+        return nodes[start:stop].tolist()
+
+    def search_by_tire_ids(self, tire_ids: List[str]) -> List[int]:
+        """
+        Return the node IDs matching any of the given tire IDs, sorted by timestamp.
+        """
+        results = set()
+        for tid in tire_ids:
+            results.update(self.search_by_tire(tid))
+        return sorted(results, key=lambda n: self._timestamps[n])
+
+    def get_path_for_node(self, node_id: int) -> List[int]:
+        """
+        Reconstruct the vehicle's path ending at `node_id` by following predecessors.
+        """
+        if node_id not in self:
+            return []
+        path = []
+        current = node_id
+        while current != NO_PREDECESSOR:
+            path.append(current)
+            current = self._predecessors[current]
+        return list(reversed(path))
+
+    def get_path_by_tire(self, tire_id: str) -> List[int]:
+        """
+        Retrieve the event path ending at the most recent detection of a tire.
+        """
+        nodes = self.search_by_tire(tire_id)
+        if not nodes:
+            return []
+        return self.get_path_for_node(nodes[-1])
+
+    def search_by_tire_model(self, tire_model: str) -> List[int]:
+        """
+        Return the node IDs of events with the given tire model, sorted by timestamp.
+        """
+        return self.search_event({'tire_model': tire_model})
+
+    def get_path_coordinates(self, path: List[int]) -> List[Tuple[float, float]]:
+        """
+        Convert a list of node IDs to (latitude, longitude) pairs.
+        """
+        return [(self._latitudes[n], self._longitudes[n]) for n in path if n in self]
+
+    def get_path_details(self, path: List[int]) -> List[Dict[str, Any]]:
+        """
+        Retrieve detailed information for each event node in the given path.
+        """
+        return [{'node_id': n, **self._node_data(n)} for n in path if n in self]
+
+    def search_event(self, query: Dict[str, Any]) -> List[int]:
+        """
+        Generic search by exact attribute values; 'tire_ids' matches if any of the
+        given ids is present. Non-tire criteria are evaluated on whole columns with
+        numpy. Results are sorted by timestamp.
+        """
+        query = dict(query)
+        if set(query.keys()) == {'tire_ids'}:
+            return self.search_by_tire_ids(query['tire_ids'])
+
+        tire_ids = query.pop('tire_ids', None)
+        if tire_ids is not None:
+            candidates = np.array(self.search_by_tire_ids(tire_ids), dtype=np.int64)
+        else:
+            candidates = np.arange(self.next_node_id)
+
+        columns = {
+            'latitude': (self._latitudes, np.float64),
+            'longitude': (self._longitudes, np.float64),
+            'battery': (self._batteries, np.float32),
+            'signal_strength': (self._signals, np.float32),
+        }
+        tables = {
+            'location': (self._locations, self._location_table),
+            'car_description': (self._descriptions, self._description_table),
+            'tire_model': (self._tire_models, self._tire_model_table),
+        }
+        for key, value in query.items():
+            if key == 'timestamp':
+                if not isinstance(value, datetime):
+                    return []
+                column = np.frombuffer(self._timestamps, dtype=np.int64)
+                candidates = candidates[column[candidates] == to_micros(value)]
+            elif key in tables:
+                codes, table = tables[key]
+                code = table.codes.get(value)
+                if code is None:
+                    return []
+                candidates = candidates[np.frombuffer(codes, dtype=np.int32)[candidates] == code]
+            elif key in columns:
+                values, dtype = columns[key]
+                column = np.frombuffer(values, dtype=dtype)[candidates]
+                candidates = candidates[np.isnan(column) if value is None else column == dtype(value)]
+            elif value is not None:
+                # Unknown attributes read as None, as with networkx node data.
+                return []
+
+        timestamps = np.frombuffer(self._timestamps, dtype=np.int64)[candidates]
+        return candidates[np.argsort(timestamps, kind="stable")].tolist()
+
+    def nbytes(self) -> int:
+        """
+        Memory held by the columns and tire index arrays (not counting strings).
+        """
+        columns = [
+            self._timestamps, self._latitudes, self._longitudes, self._batteries, self._signals,
+            self._locations, self._descriptions, self._tire_models, self._predecessors, self._tire_offsets, self._tire_codes,
+            *self._tire_nodes,
+        ]
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the network to the dictionary format of TPMSNetwork.to_dict.
+        """
+        return {
+            'next_node_id': self.next_node_id,
+            'nodes': [{'id': n, **self._node_data(n)} for n in range(self.next_node_id)],
+            'edges': [
+                (prev, n) for n, prev in enumerate(self._predecessors) if prev != NO_PREDECESSOR
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CompactTPMSNetwork':
+        """
+        Create a network from a TPMSNetwork.to_dict-style dictionary. Node ids must be
+        0..next_node_id-1 and every node may have at most one incoming edge.
+        """
+        network = cls()
+        nodes = sorted(data['nodes'], key=lambda node: node['id'])
+        predecessors = {v: u for u, v in data['edges']}
+        for expected, node in enumerate(nodes):
+            if node['id'] != expected:
+                raise ValueError("CompactTPMSNetwork requires consecutive node ids")
+            micros = to_micros(node['timestamp'])
+            tire_codes = [network._tire_table.encode(tid) for tid in node.get('tire_ids', [])]
+            network._timestamps.append(micros)
+            network._latitudes.append(node['latitude'])
+            network._longitudes.append(node['longitude'])
+            battery, signal = node.get('battery'), node.get('signal_strength')
+            network._batteries.append(battery if battery is not None else np.nan)
+            network._signals.append(signal if signal is not None else np.nan)
+            network._locations.append(network._location_table.encode(node.get('location')))
+            network._descriptions.append(network._description_table.encode(node.get('car_description', "")))
+            network._tire_models.append(network._tire_model_table.encode(node.get('tire_model')))
+            network._predecessors.append(predecessors.get(expected, NO_PREDECESSOR))
+            network._tire_codes.extend(tire_codes)
+            network._tire_offsets.append(len(network._tire_codes))
+            network.next_node_id += 1
+            for code in tire_codes:
+                network._index_tire(code, expected, micros)
+        return network
@@ -1,7 +1,17 @@
+import sys
 import uuid
 from datetime import datetime
 
+def _intern(value):
+    # Model, car and location names repeat across millions of detections; interning
+    # makes every detection share one string object per distinct name.
+    return sys.intern(value) if type(value) is str else value
+
 class Detection:
+    # No per-instance __dict__: detections are held by the million in Readings.
+    __slots__ = ('id', 'timestamp', 'tpms_id', 'tpms_model', 'car_model', 'location',
+                 'latitude', 'longitude', 'signal_strength')
+
     def __init__(self, 
                  timestamp: datetime, 
                  tpms_id: str, 
@@ -29,10 +39,10 @@ class Detection:
         """
         self.id = id if id is not None else uuid.uuid4()
         self.timestamp = timestamp
-        self.tpms_id = tpms_id
-        self.tpms_model = tpms_model
-        self.car_model = car_model
-        self.location = location
+        self.tpms_id = _intern(tpms_id)
+        self.tpms_model = _intern(tpms_model)
+        self.car_model = _intern(car_model)
+        self.location = _intern(location)
         self.latitude = latitude
         self.longitude = longitude
         self.signal_strength = signal_strength
@@ -56,7 +66,7 @@ class Detection:
             raise KeyError(f"{key} is not a valid attribute.")
 
     def keys(self):
-        return ['id', 'timestamp', 'tpms_id', 'tpms_model', 'car_model', 'location', 'latitude', 'longitude', 'signal_strength']
+        return list(self.__slots__)
 
     def values(self):
         return [getattr(self, key) for key in self.keys()]
@@ -0,0 +1,105 @@
+import re
+import threading
+from typing import Dict, Iterable, List, Set
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+class NGramIndex:
+    def __init__(self, n: int = 3):
+        """
+        Thread-safe n-gram index over a set of distinct strings, e.g. every tpms_model
+        seen so far. Matching is case-insensitive.
+
+        It turns a substring or fuzzy query into the exact set of stored values that
+        match, so the database only has to run an indexed equality / IN query.
+
+        Parameters:
+            n (int): Gram length; 3 (trigrams) like PostgreSQL's pg_trgm.
+        """
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        self.n = n
+        self._values: Set[str] = set()
+        self._grams: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def _substring_grams(self, text: str) -> Set[str]:
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def _padded_grams(self, text: str) -> Set[str]:
+        # Like pg_trgm, every word is padded separately so that word starts and ends
+        # produce grams of their own and word order matters little.
+        grams: Set[str] = set()
+        for word in _WORD.findall(text):
+            grams |= self._substring_grams(" " * (self.n - 1) + word + " ")
+        return grams
+
+    def add(self, value: str) -> bool:
+        """
+        Index `value`. Returns False if it was already present.
+        """
+        if value in self._values:
+            return False
+        with self._lock:
+            if value in self._values:
+                return False
+            self._values.add(value)
+            for gram in self._padded_grams(value.lower()):
+                self._grams.setdefault(gram, set()).add(value)
+        return True
+
+    def update(self, values: Iterable[str]) -> int:
+        """
+        Index every new value in `values`. Returns how many were added.
+        """
+        return sum(1 for value in set(values) if value and self.add(value))
+
+    def substring(self, query: str) -> List[str]:
+        """
+        Return the stored values containing `query`, the equivalent of
+        ILIKE '%query%'.
+        """
+        query = query.lower()
+        with self._lock:
+            # Grams inside the query's words are grams of every matching value; grams
+            # spanning a word boundary were never indexed.
+            grams = set()
+            for word in _WORD.findall(query):
+                grams |= self._substring_grams(word)
+            if not grams:
+                candidates: Iterable[str] = self._values
+            else:
+                postings = sorted((self._grams.get(gram, set()) for gram in grams), key=len)
+                candidates = set.intersection(*postings) if postings[0] else set()
+            return sorted(value for value in candidates if query in value.lower())
+
+    def similar(self, query: str, threshold: float = 0.3) -> List[str]:
+        """
+        Return the stored values whose n-gram similarity to `query` (shared grams over
+        all grams of both, as in pg_trgm) is at least `threshold`, best match first.
+        Values containing `query` always match.
+        """
+        query = query.lower()
+        query_grams = self._padded_grams(query)
+        shared: Dict[str, int] = {}
+        with self._lock:
+            for gram in query_grams:
+                for value in self._grams.get(gram, ()):
+                    shared[value] = shared.get(value, 0) + 1
+        scored = []
+        for value, count in shared.items():
+            total = len(query_grams) + len(self._padded_grams(value.lower())) - count
+            score = count / total
+            if score >= threshold or query in value.lower():
+                scored.append((score, value))
+        # Very short queries can be contained in a value without sharing a padded gram.
+        scored.extend((0.0, value) for value in self.substring(query) if value not in shared)
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [value for _, value in scored]
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._values
+
+    def __len__(self):
+        return len(self._values)
@@ -1,42 +1,220 @@
 from DS.Detection import Detection
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
+from itertools import islice
+import sys
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+# Keys served from TimeIndex instances, checked by the query planner.
+INDEXED_KEYS = ('tpms_id', 'tpms_model', 'car_model', 'location')
+# Evicted prefixes shorter than this are never compacted away.
+COMPACT_MIN = 64
+
+
+class TimeIndex:
+    def __init__(self):
+        """
+        Detections kept in timestamp order, with a parallel list of their timestamps
+        for bisecting. In-order arrivals are appended in O(1); late arrivals are
+        inserted at their position.
+
+        The oldest detections are evicted by advancing a head offset; the lists are
+        compacted once the evicted prefix is as long as the live part, so eviction
+        costs amortized O(1).
+        """
+        self.timestamps: List[datetime] = []
+        self.detections: List[Optional[Detection]] = []
+        self._head = 0
+
+    def add(self, detection: Detection):
+        timestamp = detection.timestamp
+        if len(self) == 0 or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.detections.append(detection)
+        else:
+            pos = bisect_right(self.timestamps, timestamp, lo=self._head)
+            self.timestamps.insert(pos, timestamp)
+            self.detections.insert(pos, detection)
+
+    def bounds(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Tuple[int, int]:
+        """
+        Return the [start, stop) positions of the detections with
+        since <= timestamp <= until, in O(log n).
+        """
+        start = bisect_left(self.timestamps, since, lo=self._head) if since is not None else self._head
+        stop = bisect_right(self.timestamps, until, lo=self._head) if until is not None else len(self.timestamps)
+        return start, max(start, stop)
+
+    def oldest(self) -> Optional[Detection]:
+        return self.detections[self._head] if len(self) else None
+
+    def newest(self) -> Optional[Detection]:
+        return self.detections[-1] if len(self) else None
+
+    def pop_oldest(self) -> Detection:
+        detection = self.detections[self._head]
+        self.detections[self._head] = None
+        self._head += 1
+        if self._head >= COMPACT_MIN and self._head * 2 >= len(self.detections):
+            del self.detections[:self._head]
+            del self.timestamps[:self._head]
+            self._head = 0
+        return detection
+
+    def remove(self, detection: Detection):
+        """
+        Remove a specific detection, in O(log n + ties) to find it plus the list shift.
+        """
+        start, stop = self.bounds(detection.timestamp, detection.timestamp)
+        for pos in range(start, stop):
+            if self.detections[pos] is detection:
+                del self.detections[pos]
+                del self.timestamps[pos]
+                return
+
+    def __len__(self):
+        return len(self.detections) - self._head
+
+    def __iter__(self):
+        return islice(self.detections, self._head, None)
+
+    def __getitem__(self, index):
+        live = range(self._head, len(self.detections))[index]
+        if isinstance(live, range):
+            return [self.detections[i] for i in live]
+        return self.detections[live]
+
+    def container_bytes(self) -> int:
+        return sys.getsizeof(self.timestamps) + sys.getsizeof(self.detections)
+
 
 class Readings:
-    def __init__(self, detections: Optional[List[Detection]] = None):
+    def __init__(self,
+                 detections: Optional[List[Detection]] = None,
+                 max_age: Optional[timedelta] = None,
+                 max_count: Optional[int] = None):
         """
         Initialize the Readings container with an optional list of Detection objects.
         Internal indexes are built for fast lookup.
+
+        Every index keeps its detections in timestamp order, so a search bisects the
+        time range of the smallest matching index and checks only those candidates.
+
+        Retention is optional. With `max_count`, adding a detection beyond the limit
+        evicts the oldest one. With `max_age`, detections older than the newest
+        detection's timestamp minus `max_age` are evicted. Data time is used rather
+        than the wall clock so that historical uploads are kept; call
+        `evict_expired(now)` to expire by wall clock. Eviction removes the detection
+        from every index in amortized O(1).
+
+        Parameters:
+            detections (List[Detection], optional): Initial detections.
+            max_age (timedelta, optional): Maximum age of a kept detection.
+            max_count (int, optional): Maximum number of kept detections.
         """
-        self._detections: List[Detection] = detections if detections is not None else []
+        if max_count is not None and max_count < 1:
+            raise ValueError("max_count must be at least 1")
+        self.max_age = max_age
+        self.max_count = max_count
+        self.evicted = 0
         # Build indexes for faster searches.
         self.index_by_id: Dict[uuid.UUID, Detection] = {}
-        self.index_by_tpms_model: Dict[str, List[Detection]] = defaultdict(list)
-        self.index_by_car_model: Dict[str, List[Detection]] = defaultdict(list)
-        self.index_by_tpms_id: Dict[str, List[Detection]] = defaultdict(list)
-        
-        for detection in self._detections:
-            self._add_to_indexes(detection)
+        self.index_by_time = TimeIndex()
+        self.index_by_tpms_model: Dict[str, TimeIndex] = defaultdict(TimeIndex)
+        self.index_by_car_model: Dict[str, TimeIndex] = defaultdict(TimeIndex)
+        self.index_by_tpms_id: Dict[str, TimeIndex] = defaultdict(TimeIndex)
+        self.index_by_location: Dict[str, TimeIndex] = defaultdict(TimeIndex)
+        self._indexes: Dict[str, Dict[str, TimeIndex]] = {
+            'tpms_id': self.index_by_tpms_id,
+            'tpms_model': self.index_by_tpms_model,
+            'car_model': self.index_by_car_model,
+            'location': self.index_by_location,
+        }
+
+        for detection in detections or []:
+            self.add(detection)
 
     def _add_to_indexes(self, detection: Detection):
         self.index_by_id[detection.id] = detection
-        self.index_by_tpms_model[detection.tpms_model].append(detection)
-        self.index_by_car_model[detection.car_model].append(detection)
-        self.index_by_tpms_id[detection.tpms_id].append(detection)
+        self.index_by_time.add(detection)
+        for key, index in self._indexes.items():
+            index[getattr(detection, key)].add(detection)
 
     def add(self, detection: Detection):
         """
-        Add a new Detection to the collection and update indexes.
+        Add a new Detection to the collection, update indexes and apply retention.
         """
-        self._detections.append(detection)
         self._add_to_indexes(detection)
+        if self.max_count is not None:
+            while len(self.index_by_time) > self.max_count:
+                self._evict_oldest()
+        if self.max_age is not None:
+            self.evict_expired(self.index_by_time.newest().timestamp)
 
-    def search(self, **kwargs) -> List[Detection]:
+    def evict_expired(self, now: Optional[datetime] = None) -> int:
+        """
+        Evict detections older than `now` - max_age (by default relative to the
+        newest detection). Returns how many were evicted.
+        """
+        if self.max_age is None or not len(self.index_by_time):
+            return 0
+        if now is None:
+            now = self.index_by_time.newest().timestamp
+        cutoff = now - self.max_age
+        count = 0
+        while len(self.index_by_time) and self.index_by_time.oldest().timestamp < cutoff:
+            self._evict_oldest()
+            count += 1
+        return count
+
+    def _evict_oldest(self):
+        detection = self.index_by_time.pop_oldest()
+        if self.index_by_id.get(detection.id) is detection:
+            del self.index_by_id[detection.id]
+        for key, indexes in self._indexes.items():
+            value = getattr(detection, key)
+            index = indexes[value]
+            # Indexes order equal timestamps by arrival like the time index does, so
+            # the globally oldest detection is also the oldest of its own indexes.
+            if index.oldest() is detection:
+                index.pop_oldest()
+            else:
+                index.remove(detection)
+            if not len(index):
+                del indexes[value]
+        self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Size and retention figures of this container. `approx_bytes` counts the
+        Detection, UUID and datetime objects and the index containers, but not the
+        interned strings shared between detections.
+        """
+        count = len(self.index_by_time)
+        oldest = self.index_by_time.oldest()
+        newest = self.index_by_time.newest()
+        per_detection = 0
+        if oldest is not None:
+            per_detection = sys.getsizeof(oldest) + sys.getsizeof(oldest.id) + sys.getsizeof(oldest.timestamp)
+        containers = sys.getsizeof(self.index_by_id) + self.index_by_time.container_bytes()
+        for indexes in self._indexes.values():
+            containers += sys.getsizeof(indexes) + sum(index.container_bytes() for index in indexes.values())
+        return {
+            'count': count,
+            'evicted': self.evicted,
+            'max_count': self.max_count,
+            'max_age_seconds': self.max_age.total_seconds() if self.max_age is not None else None,
+            'oldest': oldest.timestamp if oldest is not None else None,
+            'newest': newest.timestamp if newest is not None else None,
+            'approx_bytes': count * per_detection + containers,
+        }
+
+    def search(self, since: Optional[datetime] = None, until: Optional[datetime] = None, **kwargs) -> List[Detection]:
         """
         Optimized search for detections using key=value parameters.
-        
+
         Supported keys include:
             - id (UUID)
             - tpms_id (str)
@@ -44,55 +222,55 @@ class Readings:
             - car_model (str)
             - location (str)
             - timestamp (datetime)  (Exact match)
-        
-        For the indexed keys (id, tpms_model, car_model, tpms_id), set intersections are used.
-        Any non-indexed keys are applied as additional filters.
+        `since` and `until` restrict results to since <= timestamp <= until.
+
+        The planner bisects the time range in the index of every indexed key given
+        (or in the overall time index), starts from the one with the fewest
+        candidates and checks the remaining keys on those candidates only, so a
+        search costs O(log n + k) for k candidates. Results are sorted by timestamp.
         """
-        # Gather sets for keys that are indexed.
-        sets = []
         if 'id' in kwargs:
-            detection = self.index_by_id.get(kwargs['id'])
-            sets.append({detection} if detection is not None else set())
-            del kwargs['id']
-        if 'tpms_model' in kwargs:
-            detections = self.index_by_tpms_model.get(kwargs['tpms_model'], [])
-            sets.append(set(detections))
-            del kwargs['tpms_model']
-        if 'car_model' in kwargs:
-            detections = self.index_by_car_model.get(kwargs['car_model'], [])
-            sets.append(set(detections))
-            del kwargs['car_model']
-        if 'tpms_id' in kwargs:
-            detections = self.index_by_tpms_id.get(kwargs['tpms_id'], [])
-            sets.append(set(detections))
-            del kwargs['tpms_id']
-        
-        # Start with all detections if no indexed key is provided.
-        if sets:
-            result_set = set.intersection(*sets)
+            detection = self.index_by_id.get(kwargs.pop('id'))
+            candidates = [detection] if detection is not None else []
+            if candidates and ((since is not None and detection.timestamp < since)
+                               or (until is not None and detection.timestamp > until)):
+                candidates = []
         else:
-            result_set = set(self._detections)
-        
-        # Filter remaining non-indexed keys (e.g. location, timestamp).
-        filtered = [
-            d for d in result_set 
+            best: Optional[Tuple[TimeIndex, int, int]] = None
+            for key in INDEXED_KEYS:
+                if key not in kwargs:
+                    continue
+                index = self._indexes[key].get(kwargs[key])
+                if index is None:
+                    return []
+                start, stop = index.bounds(since, until)
+                if best is None or stop - start < best[2] - best[1]:
+                    best = (index, start, stop)
+            if best is None:
+                best = (self.index_by_time, *self.index_by_time.bounds(since, until))
+            index, start, stop = best
+            candidates = index.detections[start:stop]
+
+        # Check the remaining keys (including those of the indexes not scanned).
+        if not kwargs:
+            return candidates
+        return [
+            d for d in candidates
             if all(getattr(d, key, None) == value for key, value in kwargs.items())
         ]
-        
-        # Return results sorted by timestamp.
-        return sorted(filtered, key=lambda d: d.timestamp)
 
+    # Iteration and indexing follow timestamp order.
     def __iter__(self):
-        return iter(self._detections)
+        return iter(self.index_by_time)
 
     def __len__(self):
-        return len(self._detections)
+        return len(self.index_by_time)
 
     def __getitem__(self, index):
-        return self._detections[index]
+        return self.index_by_time[index]
 
     def to_list(self) -> List[Dict[str, Any]]:
         """
         Returns the list of detections as dictionaries.
         """
-        return [d.to_dict() for d in self._detections]
\ No newline at end of file
+        return [d.to_dict() for d in self.index_by_time]
@@ -0,0 +1,90 @@
+import heapq
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def _sort_key(detection: Dict[str, Any]) -> Tuple[datetime, str]:
+    return (detection["timestamp"], str(detection["id"]))
+
+
+class RecentDetections:
+    def __init__(self, capacity: int):
+        """
+        Bounded, thread-safe buffer of the `capacity` most recent detections.
+
+        Detections are plain dictionaries with at least 'id' and 'timestamp' keys and
+        are kept ordered by (timestamp, id). In-order arrivals are appended in O(1);
+        late arrivals are inserted at their position and anything older than the
+        newest `capacity` detections is dropped. Dropping advances a head offset and
+        the lists are compacted once the dropped prefix reaches `capacity`, so
+        eviction costs amortized O(1) like Readings' TimeIndex.
+
+        Parameters:
+            capacity (int): Maximum number of detections to keep.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._keys: List[Tuple[datetime, str]] = []
+        self._items: List[Optional[Dict[str, Any]]] = []
+        self._head = 0
+        self._lock = threading.Lock()
+
+    def _insert(self, detection: Dict[str, Any]):
+        key = _sort_key(detection)
+        if len(self) >= self.capacity and key <= self._keys[self._head]:
+            return
+        if len(self) == 0 or key >= self._keys[-1]:
+            self._keys.append(key)
+            self._items.append(detection)
+        else:
+            pos = bisect_right(self._keys, key, lo=self._head)
+            self._keys.insert(pos, key)
+            self._items.insert(pos, detection)
+        if len(self) > self.capacity:
+            self._items[self._head] = None
+            self._head += 1
+            if self._head >= self.capacity:
+                del self._keys[:self._head]
+                del self._items[:self._head]
+                self._head = 0
+
+    def add(self, detection: Dict[str, Any]):
+        """
+        Record a single newly written detection.
+        """
+        with self._lock:
+            self._insert(detection)
+
+    def extend(self, detections: Iterable[Dict[str, Any]]):
+        """
+        Record many detections. Only the newest `capacity` of them can survive, so
+        they are selected first and the rest are never inserted.
+        """
+        newest = heapq.nlargest(self.capacity, detections, key=_sort_key)
+        with self._lock:
+            for detection in reversed(newest):
+                self._insert(detection)
+
+    def reset(self, detections: Iterable[Dict[str, Any]]):
+        """
+        Replace the buffer contents, e.g. when seeding from the database.
+        """
+        with self._lock:
+            self._keys = []
+            self._items = []
+            self._head = 0
+        self.extend(detections)
+
+    def latest(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return up to `limit` detections, newest first.
+        """
+        with self._lock:
+            count = len(self) if limit is None else min(limit, len(self))
+            return self._items[len(self._items) - count:][::-1]
+
+    def __len__(self):
+        return len(self._items) - self._head
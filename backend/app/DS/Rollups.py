@@ -0,0 +1,275 @@
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from hashlib import blake2b
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+def hour_of(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def day_of(timestamp: datetime) -> date:
+    return timestamp.date()
+
+
+def _hash64(value: str) -> int:
+    # Stable across processes, unlike hash(), so sketches stay comparable.
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class DistinctCounter:
+    __slots__ = ("_values", "_registers", "_estimate")
+
+    # Values counted exactly before switching to the sketch.
+    EXACT_LIMIT = 128
+    # 2**PRECISION one-byte registers: 2 KiB, about 2.3% standard error.
+    PRECISION = 11
+
+    def __init__(self):
+        """
+        Number of distinct values seen, in bounded memory. Small counts are exact;
+        past EXACT_LIMIT values it becomes a HyperLogLog sketch whose size does not
+        grow with the number of values.
+        """
+        self._values: Optional[Set[str]] = set()
+        self._registers: Optional[bytearray] = None
+        self._estimate: Optional[int] = None
+
+    def add(self, value: str):
+        if self._registers is None:
+            self._values.add(value)
+            if len(self._values) > self.EXACT_LIMIT:
+                self._to_sketch()
+        else:
+            self._add_hash(_hash64(value))
+
+    def _add_hash(self, hashed: int):
+        bits = 64 - self.PRECISION
+        index = hashed >> bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+            self._estimate = None
+
+    def _to_sketch(self):
+        self._registers = bytearray(1 << self.PRECISION)
+        for value in self._values:
+            self._add_hash(_hash64(value))
+        self._values = None
+        self._estimate = None
+
+    def merge(self, other: "DistinctCounter"):
+        if other._registers is None:
+            for value in other._values:
+                self.add(value)
+            return
+        if self._registers is None:
+            self._to_sketch()
+        self._registers = bytearray(map(max, self._registers, other._registers))
+        self._estimate = None
+
+    def copy(self) -> "DistinctCounter":
+        counter = DistinctCounter()
+        counter._values = None if self._values is None else set(self._values)
+        counter._registers = None if self._registers is None else bytearray(self._registers)
+        counter._estimate = self._estimate
+        return counter
+
+    def __len__(self):
+        if self._registers is None:
+            return len(self._values)
+        if self._estimate is None:
+            m = len(self._registers)
+            estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self._registers)
+            zeros = self._registers.count(0)
+            if estimate <= 2.5 * m and zeros:
+                # Linear counting is more accurate while many registers are empty.
+                estimate = m * math.log(m / zeros)
+            self._estimate = round(estimate)
+        return self._estimate
+
+
+class Rollup:
+    def __init__(self, period: Callable[[datetime], Any]):
+        """
+        Detection count and distinct sensors per (group, period) bucket, e.g. per
+        (location, hour). Distinct sensors are kept in a DistinctCounter, so a bucket
+        stays small however many detections it counts. Groups and each group's
+        periods are kept sorted, so `series` bisects instead of sorting. Not
+        thread-safe on its own; see DetectionRollups.
+
+        Parameters:
+            period (Callable): Maps a timestamp to its period start, e.g. hour_of.
+        """
+        self.period = period
+        # group -> period -> [detection count, DistinctCounter of tpms_ids]
+        self._buckets: Dict[Hashable, Dict[Any, List[Any]]] = {}
+        # group -> its periods in ascending order
+        self._periods: Dict[Hashable, List[Any]] = {}
+        # Groups ordered by str(group), with their sort keys for bisecting.
+        self._groups: List[Hashable] = []
+        self._group_keys: List[str] = []
+
+    def _bucket(self, group: Hashable, period: Any) -> Optional[List[Any]]:
+        """
+        Return the bucket of (group, period), creating the group and period as needed.
+        Returns None for a new period, after registering it, so the caller can fill it.
+        """
+        periods = self._buckets.get(group)
+        if periods is None:
+            periods = self._buckets[group] = {}
+            self._periods[group] = []
+            pos = bisect_left(self._group_keys, str(group))
+            self._group_keys.insert(pos, str(group))
+            self._groups.insert(pos, group)
+        bucket = periods.get(period)
+        if bucket is None:
+            ordered = self._periods[group]
+            # Detections mostly arrive in time order, so this is usually an append.
+            if not ordered or ordered[-1] < period:
+                ordered.append(period)
+            else:
+                insort(ordered, period)
+        return bucket
+
+    def add(self, group: Hashable, timestamp: datetime, tpms_id: str):
+        period = self.period(timestamp)
+        bucket = self._bucket(group, period)
+        if bucket is None:
+            bucket = self._buckets[group][period] = [0, DistinctCounter()]
+        bucket[0] += 1
+        bucket[1].add(tpms_id)
+
+    def merge(self, other: "Rollup"):
+        for group, periods in other._buckets.items():
+            for period, (count, sensors) in periods.items():
+                bucket = self._bucket(group, period)
+                if bucket is None:
+                    self._buckets[group][period] = [count, sensors.copy()]
+                else:
+                    bucket[0] += count
+                    bucket[1].merge(sensors)
+
+    def get(self, group: Hashable, period: Any) -> Optional[Tuple[int, int]]:
+        """
+        Return (detections, distinct sensors) of one bucket, or None.
+        """
+        bucket = self._buckets.get(group, {}).get(period)
+        return None if bucket is None else (bucket[0], len(bucket[1]))
+
+    def series(
+        self, group: Optional[Hashable] = None, since: Any = None, until: Any = None
+    ) -> List[Tuple[Hashable, Any, int, int]]:
+        """
+        Return (group, period, detections, distinct sensors) for every bucket of
+        `group` (or of all groups) whose period lies in [since, until], ordered by
+        group and period.
+        """
+        groups = [group] if group is not None else self._groups
+        result = []
+        for g in groups:
+            ordered = self._periods.get(g, [])
+            start = bisect_left(ordered, since) if since is not None else 0
+            stop = bisect_right(ordered, until) if until is not None else len(ordered)
+            buckets = self._buckets[g] if ordered else {}
+            for period in ordered[start:stop]:
+                count, sensors = buckets[period]
+                result.append((g, period, count, len(sensors)))
+        return result
+
+    def __len__(self):
+        return sum(len(periods) for periods in self._buckets.values())
+
+
+class DetectionRollups:
+    def __init__(self):
+        """
+        Thread-safe dashboard rollups of detections: per (location, hour) and per
+        (tpms_model, day), each with the detection count and the number of distinct
+        sensors.
+
+        Writers stage a transaction's detections in their own DetectionRollups and
+        `merge` it after commit; `rebuild` recomputes everything from stored rows.
+        `built` is False until the first rebuild has finished.
+        """
+        self.by_location_hour = Rollup(hour_of)
+        self.by_model_day = Rollup(day_of)
+        self.built = False
+        # Merges received while a rebuild is reading rows, applied once it swaps in.
+        self._pending: Optional[DetectionRollups] = None
+        self._lock = threading.Lock()
+
+    def add(self, detection: Dict[str, Any]):
+        """
+        Count one detection mapping (needs timestamp, tpms_id, location, tpms_model).
+        """
+        with self._lock:
+            self._add(detection["timestamp"], detection["tpms_id"], detection["location"], detection["tpms_model"])
+
+    def _add(self, timestamp: datetime, tpms_id: str, location: str, tpms_model: str):
+        self.by_location_hour.add(location, timestamp, tpms_id)
+        self.by_model_day.add(tpms_model, timestamp, tpms_id)
+
+    def merge(self, other: "DetectionRollups"):
+        with self._lock:
+            self.by_location_hour.merge(other.by_location_hour)
+            self.by_model_day.merge(other.by_model_day)
+            if self._pending is not None:
+                self._pending.merge(other)
+
+    def rebuild(self, rows: Iterable[Tuple[datetime, str, str, str]]) -> int:
+        """
+        Replace the rollups with ones computed from (timestamp, tpms_id, location,
+        tpms_model) tuples. Detections merged while the rows are being read are
+        carried over into the new rollups, so `rows` should come from a query that
+        is already running when this is called; detections committed around its
+        start may be counted twice or not at all.
+
+        Returns:
+            int: Number of detections counted.
+        """
+        with self._lock:
+            self._pending = DetectionRollups()
+        fresh = DetectionRollups()
+        count = 0
+        try:
+            for timestamp, tpms_id, location, tpms_model in rows:
+                fresh._add(timestamp, tpms_id, location, tpms_model)
+                count += 1
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            fresh.merge(self._pending)
+            self._pending = None
+            self.by_location_hour = fresh.by_location_hour
+            self.by_model_day = fresh.by_model_day
+            self.built = True
+        return count
+
+    def location_hours(
+        self, location: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            series = self.by_location_hour.series(location, since and hour_of(since), until)
+        return [
+            {"location": group, "hour": hour, "detections": count, "sensors": sensors}
+            for group, hour, count, sensors in series
+        ]
+
+    def model_days(
+        self, tpms_model: Optional[str] = None, since: Optional[date] = None, until: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            series = self.by_model_day.series(tpms_model, since, until)
+        return [
+            {"tpms_model": group, "day": day, "detections": count, "sensors": sensors}
+            for group, day, count, sensors in series
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"location_hours": len(self.by_location_hour), "model_days": len(self.by_model_day)}
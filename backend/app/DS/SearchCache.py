@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional, Set, Tuple
+
+
+class SearchCache:
+    def __init__(self, capacity: int, ttl: float):
+        """
+        Bounded, thread-safe LRU cache of search results that expire after `ttl`
+        seconds.
+
+        Every entry is tagged with what it depends on: the tpms_ids it was filtered by
+        and/or the model substring it matched. `invalidate` drops only the entries a
+        write of detections for the given sensors and models could change.
+
+        Results computed while a write was being published must not be stored, so
+        callers take a `generation()` token before querying and pass it to `put`, which
+        ignores the value if an invalidation happened in between.
+
+        Parameters:
+            capacity (int): Maximum number of cached results.
+            ttl (float): Seconds a result stays valid.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.ttl = ttl
+        # key -> (expires_at, value, tpms_ids, lowercased model substring)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, FrozenSet[str], Optional[str]]]" = OrderedDict()
+        self._keys_by_id: Dict[str, Set[Hashable]] = {}
+        self._model_keys: Set[Hashable] = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _remove(self, key: Hashable):
+        _, _, ids, model = self._entries.pop(key)
+        for tpms_id in ids:
+            keys = self._keys_by_id.get(tpms_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_id[tpms_id]
+        if model is not None:
+            self._model_keys.discard(key)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return the cached value for `key`, or None when absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        generation: int,
+        tpms_ids: Iterable[str] = (),
+        model: Optional[str] = None,
+    ):
+        """
+        Store `value` under `key`, tagged with the tpms_ids and model substring it
+        depends on, unless an invalidation happened since `generation` was taken.
+        """
+        ids = frozenset(tpms_ids)
+        model = model.lower() if model is not None else None
+        with self._lock:
+            if generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, ids, model)
+            for tpms_id in ids:
+                self._keys_by_id.setdefault(tpms_id, set()).add(key)
+            if model is not None:
+                self._model_keys.add(key)
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tpms_ids: Iterable[str] = (), models: Iterable[str] = ()):
+        """
+        Drop every entry that new detections for `tpms_ids` or `models` could change:
+        entries filtered by one of the ids, and entries whose model substring occurs in
+        one of the models (case-insensitively, like the ILIKE search).
+        """
+        models = {model.lower() for model in models}
+        with self._lock:
+            self._generation += 1
+            stale: Set[Hashable] = set()
+            for tpms_id in tpms_ids:
+                stale.update(self._keys_by_id.get(tpms_id, ()))
+            if models:
+                for key in self._model_keys:
+                    substring = self._entries[key][3]
+                    if any(substring in model for model in models):
+                        stale.add(key)
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_id.clear()
+            self._model_keys.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
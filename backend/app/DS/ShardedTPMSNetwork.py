@@ -0,0 +1,505 @@
+"""
+ShardedTPMSNetwork.py
+
+A TPMS event network partitioned into time shards (e.g. one TPMSNetwork per day).
+
+Each shard links the events inside its period exactly like TPMSNetwork. The first
+event of a car's chain in a shard is stitched to its predecessor in an earlier shard
+through `boundary_links`, so paths cross shard boundaries and the result matches a
+single TPMSNetwork built from the same events in timestamp order.
+
+Node IDs are global: (shard key << 32) | node ID inside the shard, where the shard key
+is the number of whole shard periods since the epoch. Timestamps are naive.
+
+Because shards are independent until stitched, they can be built in parallel on a
+process pool (build), evicted or archived as a whole once old enough (evict_before),
+and queries with a time window only visit the shards that overlap it.
+"""
+
+import gc
+import json
+import multiprocessing
+import os
+import tempfile
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Tuple, Dict, Optional, Any, Iterable, Set
+from DS.TPMSNetwork import TPMSNetwork
+from DS.timestamps import EPOCH
+
+SHARD_BITS = 32
+_LOCAL_MASK = (1 << SHARD_BITS) - 1
+# Maximum gap between linked events, as in TPMSNetwork._find_latest_event_for_car.
+LINK_THRESHOLD_SECONDS = 3600
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# An event as the positional arguments of TPMSNetwork.add_event: (timestamp, location,
+# latitude, longitude, battery, signal_strength, tire_ids, car_description, tire_model).
+Event = Tuple[Any, ...]
+
+
+def node_ref(shard_key: int, local_id: int) -> int:
+    return (shard_key << SHARD_BITS) | local_id
+
+
+def split_ref(node_id: int) -> Tuple[int, int]:
+    return node_id >> SHARD_BITS, node_id & _LOCAL_MASK
+
+
+def _build_shard(events: List[Event]) -> TPMSNetwork:
+    """
+    Build one shard from its events (process pool worker).
+    """
+    network = TPMSNetwork()
+    for event in sorted(events, key=lambda event: event[0]):
+        network.add_event(*event)
+    return network
+
+
+class ShardedTPMSNetwork:
+    def __init__(self, shard_seconds: int = 86400):
+        """
+        Initialize an empty network partitioned into shards of `shard_seconds`.
+
+        Parameters:
+            shard_seconds (int): Length of a shard's time period (default: one day).
+        """
+        if shard_seconds <= 0:
+            raise ValueError("shard_seconds must be positive")
+        self.shard_seconds = shard_seconds
+        self._period = timedelta(seconds=shard_seconds)
+        self.shards: Dict[int, TPMSNetwork] = {}
+        # Shard keys in ascending (time) order.
+        self.shard_keys: List[int] = []
+        # Global node ID of a chain's first event in a shard -> its predecessor in an
+        # earlier shard.
+        self.boundary_links: Dict[int, int] = {}
+        self.evicted_shards = 0
+        # Shards changed since the last save_snapshot, and the files it wrote.
+        self._unsaved: Set[int] = set()
+        self._saved_files: Dict[int, str] = {}
+        self._generation = 0
+
+    def shard_key(self, timestamp: datetime) -> int:
+        return (timestamp - EPOCH) // self._period
+
+    def shard_start(self, shard_key: int) -> datetime:
+        return EPOCH + shard_key * self._period
+
+    def _get_or_create_shard(self, shard_key: int) -> TPMSNetwork:
+        shard = self.shards.get(shard_key)
+        if shard is None:
+            shard = self.shards[shard_key] = TPMSNetwork()
+            insort(self.shard_keys, shard_key)
+        return shard
+
+    def _keys_in(self, since: Optional[datetime], until: Optional[datetime]) -> List[int]:
+        """
+        Keys of the shards overlapping [since, until] (partition pruning).
+        """
+        start = bisect_left(self.shard_keys, self.shard_key(since)) if since is not None else 0
+        stop = bisect_right(self.shard_keys, self.shard_key(until)) if until is not None else len(self.shard_keys)
+        return self.shard_keys[start:stop]
+
+    def add_event(self,
+                  timestamp: datetime,
+                  location: str,
+                  latitude: float,
+                  longitude: float,
+                  battery: float,
+                  signal_strength: float,
+                  tire_ids: List[str],
+                  car_description: str = "",
+                  tire_model: Optional[str] = None) -> int:
+        """
+        Add an event to the shard of its timestamp, as TPMSNetwork.add_event does.
+        If it has no predecessor inside the shard, it is linked to the latest event
+        of the same car in an earlier shard (within the same one hour threshold).
+
+        Returns:
+            int: The global node ID of this event.
+        """
+        if not isinstance(timestamp, datetime):
+            raise TypeError("timestamp must be a datetime object")
+        key = self.shard_key(timestamp)
+        shard = self._get_or_create_shard(key)
+        local_id = shard.add_event(timestamp, location, latitude, longitude, battery,
+                                   signal_strength, tire_ids, car_description, tire_model)
+        self._unsaved.add(key)
+        node_id = node_ref(key, local_id)
+        if shard.graph.in_degree(local_id) == 0:
+            predecessor = self._boundary_predecessor(key, tire_ids, timestamp)
+            if predecessor is not None:
+                self.boundary_links[node_id] = predecessor
+        return node_id
+
+    def _boundary_predecessor(self, shard_key: int, tire_ids: List[str], timestamp: datetime) -> Optional[int]:
+        """
+        Latest event sharing a tire in a shard before `shard_key`, within the link
+        threshold. Only shards that end after timestamp - threshold are visited.
+        """
+        earliest = timestamp - timedelta(seconds=LINK_THRESHOLD_SECONDS)
+        for pos in range(bisect_left(self.shard_keys, shard_key) - 1, -1, -1):
+            key = self.shard_keys[pos]
+            if self.shard_start(key + 1) <= earliest:
+                break
+            local_id = self.shards[key]._find_latest_event_for_car(tire_ids, timestamp, LINK_THRESHOLD_SECONDS)
+            if local_id is not None:
+                return node_ref(key, local_id)
+        return None
+
+    def _stitch(self, shard_key: int):
+        """
+        Recompute the boundary links of the chain starts in a shard. Only events
+        within the link threshold of the shard's start can have one, so the shard's
+        time order is cut there.
+        """
+        shard = self.shards[shard_key]
+        reach = self.shard_start(shard_key) + timedelta(seconds=LINK_THRESHOLD_SECONDS)
+        data = shard.graph.nodes
+        for local_id in shard.time_order[:bisect_left(shard._order_times, reach)]:
+            node_id = node_ref(shard_key, local_id)
+            self.boundary_links.pop(node_id, None)
+            if shard.graph.in_degree(local_id) == 0:
+                predecessor = self._boundary_predecessor(shard_key, data[local_id]['tire_ids'], data[local_id]['timestamp'])
+                if predecessor is not None:
+                    self.boundary_links[node_id] = predecessor
+
+    @classmethod
+    def build(cls,
+              events: Iterable[Event],
+              shard_seconds: int = 86400,
+              max_workers: int = 0) -> 'ShardedTPMSNetwork':
+        """
+        Build a network from events given as TPMSNetwork.add_event argument tuples.
+
+        With `max_workers` > 1 the events are grouped by shard, the shards are built
+        on a process pool and then stitched together; otherwise the events are added
+        one by one in the order given.
+
+        Parameters:
+            events (Iterable[Event]): Events to add.
+            shard_seconds (int): Length of a shard's time period.
+            max_workers (int): Worker processes (0 or 1: build in this process).
+
+        Returns:
+            ShardedTPMSNetwork: The built network.
+        """
+        network = cls(shard_seconds)
+        if max_workers <= 1:
+            for event in events:
+                network.add_event(*event)
+            return network
+
+        grouped: Dict[int, List[Event]] = {}
+        for event in events:
+            grouped.setdefault(network.shard_key(event[0]), []).append(event)
+        keys = sorted(grouped)
+        # Spawned workers do not inherit the server's threads and locks.
+        context = multiprocessing.get_context("spawn")
+        # Unpickling the shards creates millions of acyclic containers; pause the
+        # collector as TPMSNetwork.load_snapshot does.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                for key, shard in zip(keys, executor.map(_build_shard, (grouped.pop(key) for key in keys))):
+                    network.shards[key] = shard
+        finally:
+            if gc_enabled:
+                gc.enable()
+        network.shard_keys = keys
+        network._unsaved.update(keys)
+        for key in keys:
+            network._stitch(key)
+        return network
+
+    def __len__(self):
+        return sum(shard.graph.number_of_nodes() for shard in self.shards.values())
+
+    def __contains__(self, node_id: int) -> bool:
+        key, local_id = split_ref(node_id)
+        shard = self.shards.get(key)
+        return shard is not None and local_id in shard.graph
+
+    def _window(self, shard_key: int, nodes: List[int],
+                since: Optional[datetime], until: Optional[datetime]) -> List[int]:
+        """
+        Global IDs of the shard's `nodes` (in timestamp order) inside [since, until];
+        only shards straddling a window edge are filtered.
+        """
+        start = self.shard_start(shard_key)
+        if (since is not None and since > start) or (until is not None and until < start + self._period):
+            data = self.shards[shard_key].graph.nodes
+            nodes = [n for n in nodes
+                     if (since is None or data[n]['timestamp'] >= since)
+                     and (until is None or data[n]['timestamp'] <= until)]
+        return [node_ref(shard_key, n) for n in nodes]
+
+    def search_by_tire(self,
+                       tire_id: str,
+                       since: Optional[datetime] = None,
+                       until: Optional[datetime] = None) -> List[int]:
+        """
+        Global IDs of the events with the given tire ID, optionally within
+        [since, until], sorted by timestamp.
+        """
+        results = []
+        for key in self._keys_in(since, until):
+            results.extend(node_ref(key, n) for n in self.shards[key].search_by_tire(tire_id, since, until))
+        return results
+
+    def search_by_tire_ids(self,
+                           tire_ids: List[str],
+                           since: Optional[datetime] = None,
+                           until: Optional[datetime] = None) -> List[int]:
+        """
+        Global IDs of the events matching any of the given tire IDs, optionally within
+        [since, until], sorted by timestamp.
+        """
+        results = []
+        for key in self._keys_in(since, until):
+            results.extend(self._window(key, self.shards[key].search_by_tire_ids(tire_ids), since, until))
+        return results
+
+    def search_by_tire_model(self,
+                             tire_model: str,
+                             since: Optional[datetime] = None,
+                             until: Optional[datetime] = None) -> List[int]:
+        """
+        Global IDs of the events with the given tire model, optionally within
+        [since, until], sorted by timestamp.
+        """
+        results = []
+        for key in self._keys_in(since, until):
+            results.extend(self._window(key, self.shards[key].search_by_tire_model(tire_model), since, until))
+        return results
+
+    def search_event(self,
+                     query: Dict[str, Any],
+                     since: Optional[datetime] = None,
+                     until: Optional[datetime] = None) -> List[int]:
+        """
+        TPMSNetwork.search_event over the shards overlapping [since, until].
+        """
+        results = []
+        for key in self._keys_in(since, until):
+            results.extend(self._window(key, self.shards[key].search_event(query), since, until))
+        return results
+
+    def get_path_for_node(self, node_id: int, since: Optional[datetime] = None) -> List[int]:
+        """
+        Reconstruct the vehicle's path ending at `node_id`, following predecessors
+        within shards and boundary links between them. With `since`, the path stops
+        at the first event before it and earlier shards are not visited.
+
+        Returns:
+            List[int]: Global node IDs, chronologically ordered.
+        """
+        path: List[int] = []
+        current: Optional[int] = node_id
+        while current is not None and current in self:
+            key, local_id = split_ref(current)
+            segment = self.shards[key].get_path_for_node(local_id)
+            if since is not None:
+                data = self.shards[key].graph.nodes
+                kept = [n for n in segment if data[n]['timestamp'] >= since]
+                if len(kept) < len(segment):
+                    path.extend(node_ref(key, n) for n in reversed(kept))
+                    break
+            path.extend(node_ref(key, n) for n in reversed(segment))
+            current = self.boundary_links.get(node_ref(key, segment[0]))
+        path.reverse()
+        return path
+
+    def get_path_by_tire(self,
+                         tire_id: str,
+                         since: Optional[datetime] = None,
+                         until: Optional[datetime] = None) -> List[int]:
+        """
+        The path ending at the latest detection of a tire in [since, until], limited
+        to events at or after `since`.
+        """
+        for key in reversed(self._keys_in(since, until)):
+            nodes = self.shards[key].search_by_tire(tire_id, since, until)
+            if nodes:
+                return self.get_path_for_node(node_ref(key, nodes[-1]), since)
+        return []
+
+    def get_path_coordinates(self, path: List[int]) -> List[Tuple[float, float]]:
+        """
+        Convert a list of global node IDs to (latitude, longitude) pairs.
+        """
+        coordinates = []
+        for node_id in path:
+            if node_id in self:
+                key, local_id = split_ref(node_id)
+                coordinates.extend(self.shards[key].get_path_coordinates([local_id]))
+        return coordinates
+
+    def get_path_details(self, path: List[int]) -> List[Dict[str, Any]]:
+        """
+        Details of each event in the path, as TPMSNetwork.get_path_details with
+        global node IDs.
+        """
+        details = []
+        for node_id in path:
+            if node_id in self:
+                key, local_id = split_ref(node_id)
+                for detail in self.shards[key].get_path_details([local_id]):
+                    details.append({**detail, 'node_id': node_id})
+        return details
+
+    def evict_before(self, cutoff: datetime, archive_dir: Optional[str] = None) -> int:
+        """
+        Drop every shard whose period ends at or before `cutoff`, with the boundary
+        links into and out of it. With `archive_dir`, each shard is first written
+        there as `archive-<key>.snapshot` (see restore_shard).
+
+        Returns:
+            int: Number of shards evicted.
+        """
+        evicted = [key for key in self.shard_keys if self.shard_start(key + 1) <= cutoff]
+        if not evicted:
+            return 0
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+            for key in evicted:
+                self.shards[key].save_snapshot(
+                    os.path.join(archive_dir, f"archive-{key}.snapshot"),
+                    {'shard_key': key, 'shard_seconds': self.shard_seconds},
+                )
+        gone = set(evicted)
+        for key in evicted:
+            del self.shards[key]
+            self._unsaved.discard(key)
+        self.shard_keys = [key for key in self.shard_keys if key not in gone]
+        self.boundary_links = {
+            node_id: predecessor for node_id, predecessor in self.boundary_links.items()
+            if split_ref(node_id)[0] not in gone and split_ref(predecessor)[0] not in gone
+        }
+        self.evicted_shards += len(evicted)
+        return len(evicted)
+
+    def restore_shard(self, path: str) -> int:
+        """
+        Load a shard archived by evict_before back into the network and stitch it
+        to its neighbours.
+
+        Returns:
+            int: The restored shard's key.
+        """
+        shard, metadata = TPMSNetwork.load_snapshot(path)
+        if metadata.get('shard_seconds') != self.shard_seconds:
+            raise ValueError("Archived shard has a different shard length")
+        key = metadata['shard_key']
+        if key in self.shards:
+            raise ValueError(f"Shard {key} is already loaded")
+        self.shards[key] = shard
+        insort(self.shard_keys, key)
+        self._unsaved.add(key)
+        # Chains in later shards starting within the link threshold may continue here.
+        reach = self.shard_start(key + 1) + timedelta(seconds=LINK_THRESHOLD_SECONDS)
+        for later in self.shard_keys[bisect_left(self.shard_keys, key):]:
+            if self.shard_start(later) >= reach:
+                break
+            self._stitch(later)
+        return key
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'shards': len(self.shards),
+            'events': len(self),
+            'boundary_links': len(self.boundary_links),
+            'evicted_shards': self.evicted_shards,
+            'oldest_shard': self.shard_start(self.shard_keys[0]) if self.shard_keys else None,
+            'newest_shard': self.shard_start(self.shard_keys[-1]) if self.shard_keys else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the network to the dictionary format of TPMSNetwork.to_dict, with
+        global node IDs and the boundary links among the edges.
+        """
+        nodes, edges = [], []
+        for key in self.shard_keys:
+            graph = self.shards[key].graph
+            nodes.extend({**data, 'id': node_ref(key, n)} for n, data in graph.nodes(data=True))
+            edges.extend((node_ref(key, u), node_ref(key, v)) for u, v in graph.edges())
+        edges.extend((predecessor, node_id) for node_id, predecessor in self.boundary_links.items())
+        return {'nodes': nodes, 'edges': edges}
+
+    def save_snapshot(self, directory: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Write the network to `directory`: one TPMSNetwork snapshot per shard plus a
+        manifest. Only shards changed since the last save are rewritten, each under a
+        new file name, and the manifest is replaced atomically last, so a crash never
+        pairs the manifest with shards it does not describe. Files no longer listed
+        are removed afterwards.
+
+        Returns:
+            int: Number of shard files written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._generation += 1
+        written = 0
+        for key in self.shard_keys:
+            if key in self._unsaved or key not in self._saved_files:
+                name = f"shard-{key}-{self._generation}.snapshot"
+                self.shards[key].save_snapshot(os.path.join(directory, name), {'shard_key': key})
+                self._saved_files[key] = name
+                written += 1
+        self._saved_files = {key: self._saved_files[key] for key in self.shard_keys}
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'shard_seconds': self.shard_seconds,
+            'generation': self._generation,
+            'shards': [[key, self._saved_files[key]] for key in self.shard_keys],
+            'boundary_links': list(self.boundary_links.items()),
+            'evicted_shards': self.evicted_shards,
+            'metadata': metadata or {},
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{MANIFEST_NAME}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._unsaved.clear()
+
+        listed = set(self._saved_files.values())
+        for name in os.listdir(directory):
+            if name.startswith("shard-") and name.endswith(".snapshot") and name not in listed:
+                os.remove(os.path.join(directory, name))
+        return written
+
+    @classmethod
+    def load_snapshot(cls, directory: str) -> Tuple['ShardedTPMSNetwork', Dict[str, Any]]:
+        """
+        Load a network written by save_snapshot.
+
+        Returns:
+            Tuple[ShardedTPMSNetwork, Dict[str, Any]]: The network and the stored metadata.
+
+        Raises:
+            ValueError: If the manifest is missing fields or has an unsupported version.
+        """
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported sharded network manifest version {manifest.get('version')}")
+        network = cls(manifest['shard_seconds'])
+        for key, name in manifest['shards']:
+            network.shards[key], _ = TPMSNetwork.load_snapshot(os.path.join(directory, name))
+            network.shard_keys.append(key)
+            network._saved_files[key] = name
+        network.boundary_links = {node_id: predecessor for node_id, predecessor in manifest['boundary_links']}
+        network.evicted_shards = manifest['evicted_shards']
+        network._generation = manifest['generation']
+        return network, manifest['metadata']
@@ -10,9 +10,42 @@ by the vehicle.
 This structure is intended to be used to display directional markers (e.g. on Google Maps).
 """
 
+import gc
+import json
+import mmap
+import os
+import struct
+import tempfile
 import networkx as nx
+import numpy as np
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from typing import List, Tuple, Dict, Optional, Any
+from DS.timestamps import to_micros
+
+# Binary snapshot layout: magic, format version and header length, a JSON header
+# (string tables, array directory, caller metadata), then 8-byte aligned arrays.
+SNAPSHOT_MAGIC = b"TPMSSNAP"
+SNAPSHOT_VERSION = 2
+_SNAPSHOT_PREFIX = struct.Struct("<8sII")
+_SNAPSHOT_NODE_KEYS = ('timestamp', 'location', 'latitude', 'longitude', 'battery',
+                       'signal_strength', 'tire_ids', 'car_description', 'tire_model')
+# Event attributes with a hash index (value -> node IDs in timestamp order).
+INDEXED_ATTRIBUTES = ('tire_model', 'location', 'car_description')
+
+
+def _insort_node(nodes: List[int], times: List[datetime], node_id: int, timestamp: datetime):
+    """
+    Insert a node into a timestamp-ordered node list and its parallel list of
+    timestamps: appended in O(1) when in order, otherwise after equal timestamps.
+    """
+    if not times or timestamp >= times[-1]:
+        times.append(timestamp)
+        nodes.append(node_id)
+    else:
+        pos = bisect_right(times, timestamp)
+        times.insert(pos, timestamp)
+        nodes.insert(pos, node_id)
 
 class TPMSNetwork:
     def __init__(self):
@@ -22,8 +55,16 @@ class TPMSNetwork:
         """
         self.graph: nx.DiGraph = nx.DiGraph()
         self.next_node_id: int = 0
-        # Add indexes for faster lookups: Maps tire_id to a list of node IDs.
+        # Add indexes for faster lookups: Maps tire_id to a list of node IDs, kept in
+        # timestamp order, with the matching timestamps alongside for bisecting.
         self.tire_index: Dict[str, List[int]] = {}
+        self._tire_times: Dict[str, List[datetime]] = {}
+        # All node IDs in timestamp order, and per indexed attribute a map from each
+        # value to its node IDs in timestamp order (timestamps kept alongside).
+        self.time_order: List[int] = []
+        self._order_times: List[datetime] = []
+        self.attribute_index: Dict[str, Dict[Any, List[int]]] = {key: {} for key in INDEXED_ATTRIBUTES}
+        self._attribute_times: Dict[str, Dict[Any, List[datetime]]] = {key: {} for key in INDEXED_ATTRIBUTES}
 
     def add_event(self, 
                   timestamp: datetime, 
@@ -33,7 +74,8 @@ class TPMSNetwork:
                   battery: float, 
                   signal_strength: float,
                   tire_ids: List[str], 
-                  car_description: str = "") -> int:
+                  car_description: str = "",
+                  tire_model: Optional[str] = None) -> int:
         """
         Add an event (a detection of a vehicle) to the TPMS network.
         
@@ -50,6 +92,7 @@ class TPMSNetwork:
             signal_strength (float): Signal strength of the detection.
             tire_ids (List[str]): List of tire (sensor) IDs associated with this event.
             car_description (str, optional): A description of the car.
+            tire_model (str, optional): Model of the TPMS sensors.
         
         Returns:
             int: A unique node ID representing this event.
@@ -73,20 +116,43 @@ class TPMSNetwork:
                             battery=battery,
                             signal_strength=signal_strength,
                             tire_ids=tire_ids,
-                            car_description=car_description)
+                            car_description=car_description,
+                            tire_model=tire_model)
         
         # Link this event to the latest event for the same car (if available).
         prev_node = self._find_latest_event_for_car(tire_ids, timestamp)
         if prev_node is not None:
             self.graph.add_edge(prev_node, node_id)
             
-        # Update tire index
+        self._index_tires(node_id, tire_ids, timestamp)
+        self._index_attributes(node_id, self.graph.nodes[node_id])
+        return node_id
+
+    def _index_tires(self, node_id: int, tire_ids: List[str], timestamp: datetime):
+        """
+        Add the node to the tire index of each of its tires, keeping timestamp order.
+        In-order events are appended in O(1); late ones are inserted at their position.
+        """
         for tid in tire_ids:
             if tid not in self.tire_index:
                 self.tire_index[tid] = []
-            self.tire_index[tid].append(node_id)
-            
-        return node_id
+                self._tire_times[tid] = []
+            _insort_node(self.tire_index[tid], self._tire_times[tid], node_id, timestamp)
+
+    def _index_attributes(self, node_id: int, data: Dict[str, Any]):
+        """
+        Add the node to the time order and to the index of each INDEXED_ATTRIBUTES
+        value it has (a missing attribute is indexed under None).
+        """
+        timestamp = data['timestamp']
+        _insort_node(self.time_order, self._order_times, node_id, timestamp)
+        for key in INDEXED_ATTRIBUTES:
+            value = data.get(key)
+            nodes = self.attribute_index[key].get(value)
+            if nodes is None:
+                nodes = self.attribute_index[key][value] = []
+                self._attribute_times[key][value] = []
+            _insort_node(nodes, self._attribute_times[key][value], node_id, timestamp)
 
     def _find_latest_event_for_car(self, 
                                    tire_ids: List[str], 
@@ -96,6 +162,9 @@ class TPMSNetwork:
         Find the most recent event node (by timestamp) for the same car.
         
         Matching is performed by checking if any tire ID overlaps with previous events.
+        The last entry of each tire's time-ordered index is its latest event, so an
+        in-order event is matched in O(1) per tire; an out-of-order one bisects the
+        tire's timestamps instead.
         
         Parameters:
             tire_ids (List[str]): Tire IDs of the current event.
@@ -108,24 +177,17 @@ class TPMSNetwork:
         candidate: Optional[int] = None
         candidate_time: Optional[datetime] = None
 
-        # Get potential matching nodes using the index.
-        potential_nodes = set()
         for tid in tire_ids:
-            if tid in self.tire_index:
-                potential_nodes.update(self.tire_index[tid])
-        
-        # Find the most recent matching node.
-        for n in potential_nodes:
-            data = self.graph.nodes[n]
-            event_time = data.get('timestamp')
-            if event_time is None or event_time >= current_timestamp:
+            times = self._tire_times.get(tid)
+            if not times:
                 continue
-
-            existing_tire_ids = data.get('tire_ids', [])
-            if any(tid in existing_tire_ids for tid in tire_ids):
-                if candidate is None or event_time > candidate_time:
-                    candidate = n
-                    candidate_time = event_time
+            # Position just past the latest event strictly before current_timestamp.
+            pos = len(times) if times[-1] < current_timestamp else bisect_left(times, current_timestamp)
+            if pos == 0:
+                continue
+            if candidate is None or times[pos - 1] > candidate_time:
+                candidate = self.tire_index[tid][pos - 1]
+                candidate_time = times[pos - 1]
         
         # Check time threshold.
         if candidate_time is not None:
@@ -135,13 +197,18 @@ class TPMSNetwork:
                 
         return candidate
 
-    def search_by_tire(self, tire_id: str) -> List[int]:
+    def search_by_tire(self,
+                       tire_id: str,
+                       since: Optional[datetime] = None,
+                       until: Optional[datetime] = None) -> List[int]:
         """
         Search for all event nodes that include the given tire ID.
         Uses index for faster lookup.
         
         Parameters:
             tire_id (str): The tire ID to search for.
+            since (datetime, optional): Only events with timestamp >= since.
+            until (datetime, optional): Only events with timestamp <= until.
         
         Returns:
             List[int]: A list of node IDs (chronologically sorted by timestamp) where this tire was detected.
@@ -149,9 +216,14 @@ class TPMSNetwork:
         if tire_id not in self.tire_index:
             return []
         
-        results = self.tire_index[tire_id].copy()
-        results.sort(key=lambda n: self.graph.nodes[n]['timestamp'])
-        return results
+        # The index is kept in timestamp order, so a time window is two bisections.
+        nodes = self.tire_index[tire_id]
+        if since is None and until is None:
+            return nodes.copy()
+        times = self._tire_times[tire_id]
+        start = bisect_left(times, since) if since is not None else 0
+        stop = bisect_right(times, until) if until is not None else len(times)
+        return nodes[start:stop]
 
     def search_by_tire_ids(self, tire_ids: List[str]) -> List[int]:
         """
@@ -215,9 +287,8 @@ class TPMSNetwork:
     
     def search_by_tire_model(self, tire_model: str) -> List[int]:
         """
-        Search for event nodes that match the given tire model.
-        This method assumes that each event node has a 'tire_model' attribute.
-        If the attribute is missing, the node will not be included in the results.
+        Search for event nodes that match the given tire model, using the
+        tire_model index.
 
         Parameters:
             tire_model (str): The tire model to search for.
@@ -225,12 +296,7 @@ class TPMSNetwork:
         Returns:
             List[int]: A list of matching node IDs sorted chronologically.
         """
-        results = []
-        for n, data in self.graph.nodes(data=True):
-            if data.get("tire_model") == tire_model:
-                results.append(n)
-        results.sort(key=lambda n: self.graph.nodes[n]["timestamp"])
-        return results
+        return self.attribute_index['tire_model'].get(tire_model, []).copy()
 
 
     def get_path_coordinates(self, path: List[int]) -> List[Tuple[float, float]]:
@@ -272,7 +338,8 @@ class TPMSNetwork:
                 'battery': data.get('battery'),
                 'signal_strength': data.get('signal_strength'),
                 'tire_ids': data.get('tire_ids'),
-                'car_description': data.get('car_description')
+                'car_description': data.get('car_description'),
+                'tire_model': data.get('tire_model')
             })
         return details
 
@@ -281,6 +348,11 @@ class TPMSNetwork:
         Generic search method for events based on a query dictionary.
         The query can include keys like 'tire_ids' or 'location'.
         For 'tire_ids', the search will match if any provided tire id is found.
+
+        Candidates come from the smallest of the indexes the query can use (the tire
+        index for 'tire_ids', the attribute index of each INDEXED_ATTRIBUTES key, or
+        else the time order) and only those are checked against the remaining
+        criteria. The indexes are kept in timestamp order, so no sort is needed.
         
         Parameters:
             query (Dict[str, Any]): A dictionary of search criteria.
@@ -288,14 +360,29 @@ class TPMSNetwork:
         Returns:
             List[int]: A list of matching node IDs (chronologically sorted).
         """
-        results = []
-        
         # Use tire index if only searching by tire_ids.
         if set(query.keys()) == {'tire_ids'}:
             return self.search_by_tire_ids(query['tire_ids'])
-            
-        # Otherwise, perform full search.
-        for n, data in self.graph.nodes(data=True):
+
+        candidates: Optional[List[int]] = None
+        for key in INDEXED_ATTRIBUTES:
+            if key in query:
+                nodes = self.attribute_index[key].get(query[key])
+                if not nodes:
+                    return []
+                if candidates is None or len(nodes) < len(candidates):
+                    candidates = nodes
+        if 'tire_ids' in query:
+            tire_matches = sum(len(self.tire_index.get(tid, [])) for tid in query['tire_ids'])
+            if candidates is None or tire_matches < len(candidates):
+                candidates = self.search_by_tire_ids(query['tire_ids'])
+        if candidates is None:
+            candidates = self.time_order
+
+        results = []
+        nodes = self.graph.nodes
+        for n in candidates:
+            data = nodes[n]
             match = True
             for key, value in query.items():
                 if key == 'tire_ids':
@@ -309,7 +396,6 @@ class TPMSNetwork:
                         break
             if match:
                 results.append(n)
-        results.sort(key=lambda n: self.graph.nodes[n]['timestamp'])
         return results
         
     def to_dict(self) -> Dict[str, Any]:
@@ -346,13 +432,197 @@ class TPMSNetwork:
             node_id = node_data.pop('id')
             network.graph.add_node(node_id, **node_data)
            
-            # Update tire index
-            for tid in node_data.get('tire_ids', []):
-                if tid not in network.tire_index:
-                    network.tire_index[tid] = []
-                network.tire_index[tid].append(node_id)
+            network._index_tires(node_id, node_data.get('tire_ids', []), node_data['timestamp'])
+            network._index_attributes(node_id, node_data)
                
         for u, v in data['edges']:
             network.graph.add_edge(u, v)
            
         return network
+
+    def save_snapshot(self, path: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Write the network to a versioned binary snapshot: node attributes as typed
+        columns (strings as codes into tables), edges as two id columns and the tire
+        index as offsets plus node ids. The file is written under a temporary name and
+        renamed into place, so readers never see a partial snapshot.
+
+        Timestamps are stored as naive microseconds since the epoch; a battery or
+        signal strength of None is stored as NaN.
+
+        Parameters:
+            path (str): Destination file.
+            metadata (Dict[str, Any], optional): JSON-serializable data stored alongside,
+                e.g. the watermark of the newest event included.
+
+        Returns:
+            int: Size of the snapshot in bytes.
+        """
+        tables: Dict[str, Dict[Any, int]] = {'location': {}, 'car_description': {}, 'tire_model': {}, 'tire': {}}
+
+        def encode(table: str, value: Any) -> int:
+            codes = tables[table]
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+            return code
+
+        count = self.graph.number_of_nodes()
+        node_ids = np.empty(count, dtype=np.int64)
+        timestamps = np.empty(count, dtype=np.int64)
+        floats = {key: np.empty(count, dtype=np.float64)
+                  for key in ('latitude', 'longitude', 'battery', 'signal_strength')}
+        locations = np.empty(count, dtype=np.int32)
+        descriptions = np.empty(count, dtype=np.int32)
+        tire_models = np.empty(count, dtype=np.int32)
+        tire_offsets = np.zeros(count + 1, dtype=np.int64)
+        tire_codes: List[int] = []
+        for i, (n, data) in enumerate(self.graph.nodes(data=True)):
+            node_ids[i] = n
+            timestamps[i] = to_micros(data['timestamp'])
+            for key, column in floats.items():
+                value = data.get(key)
+                column[i] = np.nan if value is None else value
+            locations[i] = encode('location', data.get('location'))
+            descriptions[i] = encode('car_description', data.get('car_description'))
+            tire_models[i] = encode('tire_model', data.get('tire_model'))
+            tire_codes.extend(encode('tire', tid) for tid in data.get('tire_ids', []))
+            tire_offsets[i + 1] = len(tire_codes)
+
+        index_offsets = np.zeros(len(self.tire_index) + 1, dtype=np.int64)
+        index_nodes: List[int] = []
+        index_tires = np.empty(len(self.tire_index), dtype=np.int32)
+        for i, (tid, nodes) in enumerate(self.tire_index.items()):
+            index_tires[i] = encode('tire', tid)
+            index_nodes.extend(nodes)
+            index_offsets[i + 1] = len(index_nodes)
+
+        edges = np.array(list(self.graph.edges()), dtype=np.int64).reshape(-1, 2)
+        arrays = {
+            'node_ids': node_ids,
+            'timestamps': timestamps,
+            **floats,
+            'locations': locations,
+            'descriptions': descriptions,
+            'tire_models': tire_models,
+            'tire_offsets': tire_offsets,
+            'tire_codes': np.array(tire_codes, dtype=np.int32),
+            'edge_sources': np.ascontiguousarray(edges[:, 0]),
+            'edge_targets': np.ascontiguousarray(edges[:, 1]),
+            'index_tires': index_tires,
+            'index_offsets': index_offsets,
+            'index_nodes': np.array(index_nodes, dtype=np.int64),
+        }
+
+        directory = {}
+        offset = 0
+        for name, array in arrays.items():
+            directory[name] = {'dtype': array.dtype.str, 'offset': offset, 'count': len(array)}
+            offset += -(-array.nbytes // 8) * 8
+        header = json.dumps({
+            'next_node_id': self.next_node_id,
+            'strings': {table: list(codes) for table, codes in tables.items()},
+            'arrays': directory,
+            'metadata': metadata or {},
+        }).encode()
+        header += b" " * (-(_SNAPSHOT_PREFIX.size + len(header)) % 8)
+
+        # A unique temporary name, so concurrent writers never share a file.
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_SNAPSHOT_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+                f.write(header)
+                for array in arrays.values():
+                    f.write(array.tobytes())
+                    f.write(b"\0" * (-array.nbytes % 8))
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return size
+
+    @classmethod
+    def load_snapshot(cls, path: str) -> Tuple['TPMSNetwork', Dict[str, Any]]:
+        """
+        Rebuild a network from a snapshot written by save_snapshot. The file is memory
+        mapped only while reading: each column is decoded from the mapping in one
+        vectorized step and copied into Python lists, since the graph holds Python
+        objects, so nothing stays mapped afterwards. Events are not re-linked, edges
+        and the tire index are restored as stored, and the time order and attribute
+        indexes are rebuilt from the columns.
+
+        Parameters:
+            path (str): Snapshot file.
+
+        Returns:
+            Tuple[TPMSNetwork, Dict[str, Any]]: The network and the stored metadata.
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version.
+        """
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if len(mapped) < _SNAPSHOT_PREFIX.size:
+                raise ValueError(f"{path} is not a TPMS network snapshot")
+            magic, version, header_size = _SNAPSHOT_PREFIX.unpack_from(mapped)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a TPMS network snapshot")
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported TPMS network snapshot version {version}")
+            header = json.loads(mapped[_SNAPSHOT_PREFIX.size:_SNAPSHOT_PREFIX.size + header_size])
+            base = _SNAPSHOT_PREFIX.size + header_size
+            # Copy each column out of the mapping in one step so it can be closed.
+            columns = {
+                name: np.frombuffer(mapped, dtype=entry['dtype'], count=entry['count'],
+                                    offset=base + entry['offset']).tolist()
+                for name, entry in header['arrays'].items()
+            }
+
+        # Millions of new (acyclic) containers would trigger repeated full
+        # collections that find nothing, so the collector is paused while building.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            strings = header['strings']
+            tires = strings['tire']
+            node_ids = columns['node_ids']
+            timestamps = np.array(columns['timestamps'], dtype='datetime64[us]').astype(object).tolist()
+            tire_offsets, tire_codes = columns['tire_offsets'], columns['tire_codes']
+            # Attribute columns in the order of _SNAPSHOT_NODE_KEYS.
+            values = zip(
+                timestamps,
+                [strings['location'][code] for code in columns['locations']],
+                columns['latitude'],
+                columns['longitude'],
+                [None if v != v else v for v in columns['battery']],
+                [None if v != v else v for v in columns['signal_strength']],
+                [[tires[code] for code in tire_codes[start:stop]]
+                 for start, stop in zip(tire_offsets, tire_offsets[1:])],
+                [strings['car_description'][code] for code in columns['descriptions']],
+                [strings['tire_model'][code] for code in columns['tire_models']],
+            )
+
+            network = cls()
+            network.next_node_id = header['next_node_id']
+            network.graph.add_nodes_from(zip(node_ids, (dict(zip(_SNAPSHOT_NODE_KEYS, row)) for row in values)))
+            network.graph.add_edges_from(zip(columns['edge_sources'], columns['edge_targets']))
+            time_of = dict(zip(node_ids, timestamps))
+            index_offsets, index_nodes = columns['index_offsets'], columns['index_nodes']
+            for i, code in enumerate(columns['index_tires']):
+                nodes = index_nodes[index_offsets[i]:index_offsets[i + 1]]
+                network.tire_index[tires[code]] = nodes
+                network._tire_times[tires[code]] = [time_of[n] for n in nodes]
+            # The time order and attribute indexes are rebuilt by visiting the nodes in
+            # timestamp order (ties in stored order), so every insertion is an append.
+            node_data = network.graph.nodes
+            for i in np.argsort(np.array(columns['timestamps'], dtype=np.int64), kind='stable').tolist():
+                network._index_attributes(node_ids[i], node_data[node_ids[i]])
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return network, header['metadata']
@@ -1,9 +1,11 @@
-from DS import Readings
+from DS import Readings, ColumnarReadings
 from DS.Detection import Detection
-from typing import List, Dict, Any
+from datetime import timedelta
+from typing import List, Dict, Any, Optional
 
 class TPMSNode:
-    def __init__(self, name: str, latitude: float, longitude: float, location: str, battery: float, signal_strength: float):
+    def __init__(self, name: str, latitude: float, longitude: float, location: str, battery: float, signal_strength: float,
+                 compact: bool = False, max_age: Optional[timedelta] = None, max_count: Optional[int] = None):
         """
         Initialize a TPMS reader node.
         
@@ -12,14 +14,23 @@ class TPMSNode:
             latitude (float): Latitude coordinate.
             longitude (float): Longitude coordinate.
             location (str): A human-friendly location name.
+            compact (bool): Store readings in a ColumnarReadings instead of a Readings,
+                trading search speed for a much smaller memory footprint.
+            max_age (timedelta, optional): Evict readings older than this, relative to
+                the newest reading.
+            max_count (int, optional): Keep at most this many readings, evicting the
+                oldest first. Together with max_age this caps the node's memory.
         """
+        if compact and (max_age is not None or max_count is not None):
+            raise ValueError("Retention limits are not supported for compact readings")
         self.name = name
         self.latitude = latitude
         self.longitude = longitude
         self.location = location
         self.battery = battery
         self.signal_strength = signal_strength
-        self.readings = Readings()  # Each reader holds its own collection of readings.
+        # Each reader holds its own collection of readings.
+        self.readings = ColumnarReadings() if compact else Readings(max_age=max_age, max_count=max_count)
     
     def add_reading(self, detection: Detection):
         """
@@ -29,10 +40,18 @@ class TPMSNode:
     
     def search_readings(self, **kwargs) -> List[Detection]:
         """
-        Search the readings within this TPMS reader using provided key=value parameters.
+        Search the readings within this TPMS reader using provided key=value parameters,
+        optionally restricted with since=/until= datetimes. With the default Readings
+        backend this costs O(log n + k).
         """
         return self.readings.search(**kwargs)
     
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Reading count, retention settings and approximate memory of this reader.
+        """
+        return {'name': self.name, **self.readings.stats()}
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             'name': self.name,
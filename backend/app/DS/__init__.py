@@ -1,7 +1,14 @@
 from .Detection import Detection
 from .Readings import Readings
+from .ColumnarReadings import ColumnarReadings
 from .TPMSNode import TPMSNode
 from .TPMSNetwork import TPMSNetwork
+from .CompactTPMSNetwork import CompactTPMSNetwork
+from .ShardedTPMSNetwork import ShardedTPMSNetwork
 from .TPMSGraph import TPMSGraph
+from .RecentDetections import RecentDetections
+from .SearchCache import SearchCache
+from .NGramIndex import NGramIndex
+from .Rollups import DetectionRollups
 
-__all__ = ["Detection", "Readings", "TPMSNode", "TPMSNetwork", "TPMSGraph"]
+__all__ = ["Detection", "Readings", "ColumnarReadings", "TPMSNode", "TPMSNetwork", "CompactTPMSNetwork", "ShardedTPMSNetwork", "TPMSGraph", "RecentDetections", "SearchCache", "NGramIndex", "DetectionRollups"]
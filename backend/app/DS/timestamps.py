@@ -0,0 +1,27 @@
+"""
+timestamps.py
+
+Columnar structures and snapshots store timestamps as int64 microseconds since EPOCH,
+as naive UTC like the detections table.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(timestamp: datetime) -> int:
+    """
+    Microseconds since EPOCH; timezone-aware values are converted to UTC first.
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // _MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    """
+    Naive UTC datetime for a to_micros value.
+    """
+    return EPOCH + timedelta(microseconds=micros)
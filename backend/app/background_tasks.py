@@ -1,31 +1,324 @@
 import asyncio
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.orm import Session
-from DS import TPMSNetwork
+from DS import ShardedTPMSNetwork, RecentDetections, SearchCache, NGramIndex, DetectionRollups
 from models.models import Detection
 from database.db import SessionLocal  
+from utils.serialization import DETECTION_COLUMNS, rows_to_dicts
+from config import (
+    LATEST_BUFFER_SIZE,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    EXPORT_BATCH_SIZE,
+    MODEL_INDEX_REFRESH_SECONDS,
+    NETWORK_REFRESH_SECONDS,
+    NETWORK_COMPACT_EVERY,
+    NETWORK_SNAPSHOT_PATH,
+    NETWORK_SNAPSHOT_SECONDS,
+    NETWORK_SHARD_HOURS,
+    NETWORK_BUILD_WORKERS,
+    NETWORK_RETENTION_DAYS,
+    NETWORK_ARCHIVE_DIR,
+)
 
-tpms_network_global = TPMSNetwork()
+tpms_network_global = ShardedTPMSNetwork(NETWORK_SHARD_HOURS * 3600)
+# (timestamp, id) of the newest detection in tpms_network_global; None before the first build.
+network_watermark: Optional[Tuple[datetime, uuid.UUID]] = None
+network_rebuild_requested = False
+# Bumped whenever detections older than the watermark are written, and the value it had
+# when the live network's last full build started. While they differ, a rebuild-required
+# marker next to the snapshot keeps a restart from loading a snapshot missing those rows.
+late_write_generation = 0
+network_build_generation = 0
+late_write_lock = threading.Lock()
+NETWORK_REBUILD_MARKER = "rebuild-required"
+latest_detections = RecentDetections(LATEST_BUFFER_SIZE)
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+tpms_model_index = NGramIndex()
+car_model_index = NGramIndex()
+detection_rollups = DetectionRollups()
+
+NETWORK_EVENT_COLUMNS = (
+    Detection.timestamp,
+    Detection.id,
+    Detection.location,
+    Detection.latitude,
+    Detection.longitude,
+    Detection.tpms_id,
+    Detection.tpms_model,
+    Detection.car_model,
+)
+
+def seed_latest_detections():
+    """
+    Fill the latest-detections buffer from the database. Ingest paths keep it
+    current afterwards, so /api/detection/latest never has to query.
+    """
+    with SessionLocal() as db:
+        rows = (
+            db.query(*DETECTION_COLUMNS)
+            .order_by(Detection.timestamp.desc())
+            .limit(latest_detections.capacity)
+            .all()
+        )
+    latest_detections.reset(rows_to_dicts(rows))
+    print(f"Seeded latest detections buffer with {len(latest_detections)} detections.")
+
+def seed_model_indexes() -> int:
+    """
+    Load the distinct tpms_model and car_model values into the n-gram indexes used
+    by model search. This process's ingest paths add new values as they write them;
+    refresh_model_indexes re-runs this for values written by anything else. Cached
+    searches a new tpms_model could change are dropped.
+
+    Returns:
+        int: Number of model names added to the indexes.
+    """
+    with SessionLocal() as db:
+        new_models = [m for m in db.scalars(select(Detection.tpms_model).distinct()) if m not in tpms_model_index]
+        new_cars = [m for m in db.scalars(select(Detection.car_model).distinct()) if m not in car_model_index]
+    added = tpms_model_index.update(new_models) + car_model_index.update(new_cars)
+    if new_models:
+        search_cache.invalidate(models=new_models)
+    print(f"Indexed {len(tpms_model_index)} TPMS models and {len(car_model_index)} car models ({added} new).")
+    return added
+
+async def refresh_model_indexes():
+    """
+    Reload model names every MODEL_INDEX_REFRESH_SECONDS, so models first written by
+    another worker, generate.py or a direct database load become searchable.
+    """
+    while True:
+        await asyncio.sleep(MODEL_INDEX_REFRESH_SECONDS)
+        try:
+            await asyncio.to_thread(seed_model_indexes)
+        except Exception as e:
+            print("Error refreshing model indexes:", e)
+
+def backfill_detection_rollups() -> int:
+    """
+    Rebuild the dashboard rollups from every stored detection, streamed in batches.
+    Ingest paths keep them current afterwards.
+
+    Returns:
+        int: Number of detections counted.
+    """
+    statement = (
+        select(Detection.timestamp, Detection.tpms_id, Detection.location, Detection.tpms_model)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    with SessionLocal() as db:
+        count = detection_rollups.rebuild(db.execute(statement))
+    print(f"Built detection rollups from {count} detections: {detection_rollups.stats()}.")
+    return count
+
+async def warm_detection_rollups():
+    """
+    Run the startup rollup backfill off the event loop, so startup does not wait on
+    a full table scan. /api/stats reports "warming" until it has finished.
+    """
+    try:
+        await asyncio.to_thread(backfill_detection_rollups)
+    except Exception as e:
+        print("Error building detection rollups:", e)
+
+def note_written_detections(oldest: datetime):
+    """
+    Called after detections are committed. Incremental refreshes only fetch rows past
+    the watermark, so detections older than it (e.g. a historical CSV upload) are
+    picked up by requesting a full rebuild. Only writes published by this process
+    get here; see NETWORK_COMPACT_EVERY for rows written elsewhere.
+    """
+    global network_rebuild_requested, late_write_generation
+    if network_watermark is not None and oldest <= network_watermark[0]:
+        with late_write_lock:
+            late_write_generation += 1
+            network_rebuild_requested = True
+            mark_network_snapshot_stale()
+
+def mark_network_snapshot_stale():
+    """
+    Persist the need for a full rebuild next to the snapshot, so a restart does not
+    load it and miss late detections. Removed once a later full build is saved.
+    """
+    if not NETWORK_SNAPSHOT_PATH:
+        return
+    try:
+        os.makedirs(NETWORK_SNAPSHOT_PATH, exist_ok=True)
+        open(os.path.join(NETWORK_SNAPSHOT_PATH, NETWORK_REBUILD_MARKER), "w").close()
+    except OSError as e:
+        # The detections are committed; the next compaction still picks them up.
+        print("Error marking TPMS network snapshot stale:", e)
+
+def network_event(row) -> Tuple[Any, ...]:
+    """
+    ShardedTPMSNetwork.add_event arguments for a NETWORK_EVENT_COLUMNS row.
+    """
+    return (row.timestamp, row.location, row.latitude, row.longitude, 100.0, 0.0,
+            [row.tpms_id], row.car_model, row.tpms_model)
+
+def refresh_tpms_network(full: bool = False) -> int:
+    """
+    Bring tpms_network_global up to date with the detections table.
+
+    Incrementally, only detections past the (timestamp, id) watermark are fetched
+    and appended to the live network in place, so the cost follows the ingest rate
+    rather than the table size. With `full` (or before the first build) a new network
+    is built from every detection (or, with NETWORK_RETENTION_DAYS, from the retained
+    window only) and swapped in, which also compacts away anything the incremental
+    path cannot see. Shards are built on NETWORK_BUILD_WORKERS processes if set.
+
+    Afterwards shards older than the retention window are evicted, and archived to
+    NETWORK_ARCHIVE_DIR if set.
+
+    Returns:
+        int: Number of events added.
+    """
+    global tpms_network_global, network_watermark, network_rebuild_requested, network_build_generation
+    statement = (
+        select(*NETWORK_EVENT_COLUMNS)
+        .order_by(Detection.timestamp, Detection.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    retention = timedelta(days=NETWORK_RETENTION_DAYS) if NETWORK_RETENTION_DAYS > 0 else None
+    full = full or network_watermark is None
+    watermark = None if full else network_watermark
+
+    with SessionLocal() as db:
+        if full:
+            with late_write_lock:
+                network_rebuild_requested = False
+                generation = late_write_generation
+            if retention is not None:
+                newest = db.scalar(select(func.max(Detection.timestamp)))
+                if newest is not None:
+                    statement = statement.where(Detection.timestamp >= newest - retention)
+
+            def events():
+                nonlocal watermark
+                for row in db.execute(statement):
+                    watermark = (row.timestamp, row.id)
+                    yield network_event(row)
+
+            network = ShardedTPMSNetwork.build(events(), NETWORK_SHARD_HOURS * 3600, NETWORK_BUILD_WORKERS)
+            added = len(network)
+            network_build_generation = generation
+        else:
+            network = tpms_network_global
+            timestamp, detection_id = watermark
+            statement = statement.where(or_(
+                Detection.timestamp > timestamp,
+                and_(Detection.timestamp == timestamp, Detection.id > detection_id),
+            ))
+            added = 0
+            for row in db.execute(statement):
+                # Rows arrive in timestamp order, so every add_event takes the O(1) path.
+                network.add_event(*network_event(row))
+                network_watermark = watermark = (row.timestamp, row.id)
+                added += 1
+    tpms_network_global = network
+    network_watermark = watermark
+
+    if retention is not None and watermark is not None:
+        evicted = network.evict_before(watermark[0] - retention, archive_dir=NETWORK_ARCHIVE_DIR or None)
+        if evicted:
+            print(f"Evicted {evicted} TPMS network shards older than {NETWORK_RETENTION_DAYS} days.")
+    return added
+
+def save_network_snapshot() -> int:
+    """
+    Write tpms_network_global and its watermark to the NETWORK_SNAPSHOT_PATH
+    directory; only shards changed since the last save are rewritten. Must not
+    overlap refresh_tpms_network, which changes the network in place. The
+    rebuild-required marker is cleared if no late detections were written since
+    the network's last full build started.
+
+    Returns:
+        int: Number of shard files written.
+    """
+    timestamp, detection_id = network_watermark
+    started = time.perf_counter()
+    written = tpms_network_global.save_snapshot(
+        NETWORK_SNAPSHOT_PATH,
+        {"watermark": [timestamp.isoformat(), str(detection_id)]},
+    )
+    with late_write_lock:
+        marker = os.path.join(NETWORK_SNAPSHOT_PATH, NETWORK_REBUILD_MARKER)
+        if network_build_generation == late_write_generation and os.path.exists(marker):
+            os.remove(marker)
+    print(f"Saved TPMS network snapshot ({written} of {len(tpms_network_global.shards)} shards written) "
+          f"in {time.perf_counter() - started:.2f}s.")
+    return written
+
+def load_network_snapshot() -> bool:
+    """
+    Replace tpms_network_global with the snapshot at NETWORK_SNAPSHOT_PATH, if there
+    is a readable one. The next incremental refresh then only fetches detections
+    newer than the snapshot's watermark. A snapshot marked as missing late
+    detections is skipped, so startup does a full build. A snapshot that no longer
+    matches the table (e.g. after a database restore) is corrected by the next full
+    rebuild.
+
+    Returns:
+        bool: Whether a snapshot was loaded.
+    """
+    global tpms_network_global, network_watermark
+    if not NETWORK_SNAPSHOT_PATH or not os.path.exists(NETWORK_SNAPSHOT_PATH):
+        return False
+    if os.path.exists(os.path.join(NETWORK_SNAPSHOT_PATH, NETWORK_REBUILD_MARKER)):
+        print("TPMS network snapshot is missing late detections; rebuilding instead.")
+        return False
+    started = time.perf_counter()
+    try:
+        network, metadata = ShardedTPMSNetwork.load_snapshot(NETWORK_SNAPSHOT_PATH)
+        if network.shard_seconds != NETWORK_SHARD_HOURS * 3600:
+            raise ValueError("snapshot was written with a different NETWORK_SHARD_HOURS")
+        timestamp, detection_id = metadata["watermark"]
+        watermark = (datetime.fromisoformat(timestamp), uuid.UUID(detection_id))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print("Ignoring unreadable TPMS network snapshot:", e)
+        return False
+    tpms_network_global = network
+    network_watermark = watermark
+    print(f"Loaded TPMS network snapshot with {len(network)} events in {len(network.shards)} shards "
+          f"in {time.perf_counter() - started:.2f}s.")
+    return True
 
 async def update_tpms_network():
-    global tpms_network_global
+    global network_rebuild_requested
+    # With a snapshot, the first refresh is incremental instead of a full build.
+    refreshes = 1 if await asyncio.to_thread(load_network_snapshot) else 0
+    snapshot_stale = False
+    last_snapshot = None
     while True:
         try:
-            new_network = TPMSNetwork()
-            with SessionLocal() as db:
-                db_detections = db.query(Detection).all()
-                for det in db_detections:
-                    new_network.add_event(
-                        timestamp=det.timestamp,
-                        location=det.location,
-                        latitude=det.latitude,
-                        longitude=det.longitude,
-                        battery=getattr(det, "battery", 100.0),       
-                        signal_strength=getattr(det, "signal_strength", 0.0), 
-                        tire_ids=[det.tpms_id],
-                        car_description=det.car_model 
-                    )
-            tpms_network_global = new_network
-            print("TPMS network updated.")
+            full = network_rebuild_requested or (
+                NETWORK_COMPACT_EVERY > 0 and refreshes % NETWORK_COMPACT_EVERY == 0
+            )
+            # Full rebuilds scan the whole table; keep them (and the smaller
+            # incremental batches) off the event loop.
+            added = await asyncio.to_thread(refresh_tpms_network, full)
+            snapshot_stale = snapshot_stale or full or added > 0
+            print(f"TPMS network updated: {added} events added ({'full rebuild' if full else 'incremental'}).")
         except Exception as e:
             print("Error updating TPMS network:", e)
-        await asyncio.sleep(15)
+            # The live network may hold a partial batch; start over next time.
+            network_rebuild_requested = True
+        refreshes += 1
+        if (NETWORK_SNAPSHOT_PATH and snapshot_stale and network_watermark is not None
+                and not network_rebuild_requested
+                and (last_snapshot is None or time.monotonic() - last_snapshot >= NETWORK_SNAPSHOT_SECONDS)):
+            try:
+                # Refreshes wait for the save, so the network is not changing.
+                await asyncio.to_thread(save_network_snapshot)
+                snapshot_stale = False
+            except Exception as e:
+                print("Error saving TPMS network snapshot:", e)
+            last_snapshot = time.monotonic()
+        await asyncio.sleep(NETWORK_REFRESH_SECONDS)
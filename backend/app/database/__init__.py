@@ -1,3 +1,4 @@
 from . import db
+from . import migrations
 
-__all__ = ["db"]
\ No newline at end of file
+__all__ = ["db", "migrations"]
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+migrations.py
+
+Minimal, ordered schema migrations for deployments whose tables were created by
+`Base.metadata.create_all`, which never alters existing tables.
+
+Each migration is an idempotent function of a connection, registered under a version
+string in MIGRATIONS. Applied versions are recorded in the `schema_migrations` table.
+Statements run in autocommit mode so that PostgreSQL can build indexes CONCURRENTLY,
+without blocking ingest on large tables.
+
+Run manually with `python -m database.migrations` from the app directory; the API also
+applies pending migrations in its startup hook. On PostgreSQL, concurrent runners (e.g.
+several API workers) are serialised by an advisory lock.
+"""
+
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+metadata = MetaData()
+
+# Rows updated per statement by data backfills.
+BACKFILL_BATCH_SIZE = 10000
+# pg_advisory_lock key held while migrations run.
+MIGRATION_LOCK_KEY = 0x4C414E54
+
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_index(conn: Connection, name: str, table: str, expression: str, using: str = ""):
+    """
+    Create an index if it does not exist yet, concurrently on PostgreSQL.
+
+    A failed concurrent build leaves an INVALID index behind, which IF NOT EXISTS
+    would skip; such an index is dropped and built again.
+    """
+    if conn.dialect.name == "postgresql":
+        valid = conn.execute(
+            text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+        ).scalar()
+        if valid is False:
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        conn.exec_driver_sql(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {using} ({expression})"
+        )
+    else:
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({expression})")
+
+
+def detection_indexes(conn: Connection):
+    # (tpms_id, timestamp) also serves plain tpms_id lookups through its leading column,
+    # and (timestamp, id) serves time-range filters as well as keyset pagination.
+    _create_index(conn, "ix_detections_tpms_id_timestamp", "detections", "tpms_id, timestamp")
+    _create_index(conn, "ix_detections_timestamp_id", "detections", "timestamp, id")
+
+
+def detection_model_trigram(conn: Connection):
+    # Superseded: this built a pg_trgm GIN index for ILIKE '%...%' model search, which
+    # now resolves names through an in-memory n-gram index. Databases that already have
+    # the index lose it in 0006; new ones never build it.
+    pass
+
+
+def detection_geo_cell(conn: Connection):
+    # Add and backfill the spatial bucket column used by /api/search/area.
+    from utils.geo import CELL_DEGREES, CELLS_PER_ROW, geo_cells
+
+    columns = {column["name"] for column in inspect(conn).get_columns("detections")}
+    if "geo_cell" not in columns:
+        conn.exec_driver_sql("ALTER TABLE detections ADD COLUMN geo_cell INTEGER")
+
+    if conn.dialect.name == "postgresql":
+        # Batches of primary-key ranges, each committed on its own (the connection is in
+        # autocommit mode), so no single transaction rewrites the whole table.
+        update = (
+            f"UPDATE detections SET geo_cell = "
+            f"CAST(FLOOR((latitude + 90.0) / {CELL_DEGREES}) AS INTEGER) * {CELLS_PER_ROW} + "
+            f"LEAST(CAST(FLOOR((longitude + 180.0) / {CELL_DEGREES}) AS INTEGER), {CELLS_PER_ROW - 1}) "
+            f"WHERE geo_cell IS NULL AND id > CAST(:after AS uuid)"
+        )
+        after = "00000000-0000-0000-0000-000000000000"
+        while True:
+            bound = conn.execute(
+                text("SELECT id FROM detections WHERE id > CAST(:after AS uuid) ORDER BY id OFFSET :last LIMIT 1"),
+                {"after": after, "last": BACKFILL_BATCH_SIZE - 1},
+            ).scalar()
+            if bound is None:
+                conn.execute(text(update), {"after": after})
+                break
+            conn.execute(text(update + " AND id <= CAST(:bound AS uuid)"), {"after": after, "bound": str(bound)})
+            after = str(bound)
+    else:
+        # Dialects without FLOOR are backfilled in batches from Python.
+        while True:
+            rows = conn.exec_driver_sql(
+                f"SELECT id, latitude, longitude FROM detections WHERE geo_cell IS NULL LIMIT {BACKFILL_BATCH_SIZE}"
+            ).fetchall()
+            if not rows:
+                break
+            ids, latitudes, longitudes = zip(*rows)
+            conn.execute(
+                text("UPDATE detections SET geo_cell = :cell WHERE id = :id"),
+                [{"cell": int(cell), "id": id_} for cell, id_ in zip(geo_cells(latitudes, longitudes), ids)],
+            )
+    _create_index(conn, "ix_detections_geo_cell_timestamp", "detections", "geo_cell, timestamp")
+
+
+def detection_model_indexes(conn: Connection):
+    # Model search resolves names through an in-memory n-gram index and then filters
+    # with equality / IN, which these B-tree indexes serve.
+    _create_index(conn, "ix_detections_tpms_model_timestamp", "detections", "tpms_model, timestamp")
+    _create_index(conn, "ix_detections_car_model_timestamp", "detections", "car_model, timestamp")
+
+
+def rebuild_invalid_indexes(conn: Connection):
+    # Earlier runs recorded migrations whose concurrent build had left an INVALID index
+    # behind; _create_index now replaces those.
+    detection_indexes(conn)
+    _create_index(conn, "ix_detections_geo_cell_timestamp", "detections", "geo_cell, timestamp")
+    detection_model_indexes(conn)
+
+
+def drop_model_trigram(conn: Connection):
+    # No query uses the trigram index since model search moved to the n-gram index,
+    # and GIN maintenance slows every insert.
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("DROP INDEX CONCURRENTLY IF EXISTS ix_detections_tpms_model_trgm")
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_detection_indexes", detection_indexes),
+    ("0002_detection_model_trigram", detection_model_trigram),
+    ("0003_detection_geo_cell", detection_geo_cell),
+    ("0004_detection_model_indexes", detection_model_indexes),
+    ("0005_rebuild_invalid_indexes", rebuild_invalid_indexes),
+    ("0006_drop_model_trigram", drop_model_trigram),
+]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """
+    Apply every migration that has not been recorded yet, in order.
+
+    On PostgreSQL the whole run holds an advisory lock and reads the applied versions
+    once it has the lock, so a runner that waited finds the others' work recorded.
+
+    Returns:
+        List[str]: The versions applied by this call.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        locking = lock_conn.dialect.name == "postgresql"
+        if locking:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            metadata.create_all(bind=engine)
+            with engine.connect() as conn:
+                applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+            newly_applied = []
+            for version, migrate in MIGRATIONS:
+                if version in applied:
+                    continue
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    migrate(conn)
+                    conn.execute(schema_migrations.insert().values(version=version, applied_at=datetime.now()))
+                newly_applied.append(version)
+                print(f"Applied migration {version}.")
+        finally:
+            if locking:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    return newly_applied
+
+
+if __name__ == "__main__":
+    import models
+    from database.db import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
+    print(f"{len(applied)} migration(s) applied.")
@@ -1,10 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import db
+from database.migrations import run_migrations
 import models
 import uvicorn
 import asyncio
-from background_tasks import update_tpms_network
+from config import MODEL_INDEX_REFRESH_SECONDS
+from background_tasks import (
+    update_tpms_network,
+    seed_latest_detections,
+    seed_model_indexes,
+    refresh_model_indexes,
+    warm_detection_rollups,
+)
 
 # Import the auth router from your routes file
 from routers.auth.auth_router import router as auth_router
@@ -12,6 +20,7 @@ from routers.upload.upload import upload_router
 from routers.detection import detection_router
 from routers.network import network_router
 from routers.search import search_router
+from routers.stats import stats_router
 from routers.visualize.route import visualize_router
 from routers.live.live_router import router as live_router
 
@@ -33,14 +42,29 @@ app.include_router(upload_router)
 app.include_router(detection_router.router)
 app.include_router(network_router.network_router)
 app.include_router(search_router.search_router)
+app.include_router(stats_router.stats_router)
 app.include_router(visualize_router)
 app.include_router(live_router)
 
-# Create database tables
-db.Base.metadata.create_all(bind=db.engine)
+def prepare_database():
+    # Create database tables
+    db.Base.metadata.create_all(bind=db.engine)
+    # Bring tables created by older versions up to date (indexes, new columns).
+    run_migrations(db.engine)
 
+# The schema is prepared in the startup hook rather than at import time: the reloader
+# and the spawned NETWORK_BUILD_WORKERS processes import this module as well.
 @app.on_event("startup")
 async def startup_event():
+    await asyncio.to_thread(prepare_database)
+    # Seed the in-memory buffer that serves /api/detection/latest.
+    seed_latest_detections()
+    # Load known model names for the model search n-gram indexes.
+    seed_model_indexes()
+    if MODEL_INDEX_REFRESH_SECONDS > 0:
+        asyncio.create_task(refresh_model_indexes())
+    # Build the dashboard rollups served by /api/stats in the background.
+    asyncio.create_task(warm_detection_rollups())
     # Start the update task for the TPMS network.
     asyncio.create_task(update_tpms_network())
 
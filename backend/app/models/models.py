@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, UUID, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, UUID, Float, Index
 import uuid
 from sqlalchemy.sql import func
 from database import db
@@ -18,6 +18,14 @@ class User(db.Base):
 
 class Detection(db.Base):
     __tablename__ = "detections"
+    # Existing deployments get these through database.migrations.
+    __table_args__ = (
+        Index("ix_detections_tpms_id_timestamp", "tpms_id", "timestamp"),
+        Index("ix_detections_timestamp_id", "timestamp", "id"),
+        Index("ix_detections_geo_cell_timestamp", "geo_cell", "timestamp"),
+        Index("ix_detections_tpms_model_timestamp", "tpms_model", "timestamp"),
+        Index("ix_detections_car_model_timestamp", "car_model", "timestamp"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     timestamp = Column(DateTime, nullable=False)
@@ -27,6 +35,8 @@ class Detection(db.Base):
     location = Column(String, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    # Spatial bucket of (latitude, longitude); see utils.geo.
+    geo_cell = Column(Integer, nullable=True)
 
 class TPMSNode(db.Base):
     __tablename__ = "tpms_nodes"
@@ -1,42 +1,198 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import and_, or_, select
 from datetime import datetime
+import base64
+import csv
+import io
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from database import db
+from database.db import SessionLocal
 from models.models import Detection
 from schemas.detections_schema import DetectionCreate
+from routers.upload.utils import create_detection_logic, create_detections_batch_logic
+from utils.serialization import (
+    DETECTION_FIELDS,
+    DETECTION_COLUMNS,
+    FastJSONResponse,
+    detection_columns,
+    rows_to_dicts,
+    dumps_ndjson,
+)
+from background_tasks import latest_detections
+from config import DETECTION_PAGE_SIZE, DETECTION_PAGE_MAX, EXPORT_BATCH_SIZE, DETECTION_BATCH_MAX, LATEST_BUFFER_SIZE
 
 router = APIRouter(prefix="/api/detection", tags=["Detection"])
 
-@router.get("/", response_model=Dict[str, Any])
-def get_all_detections(db: Session = Depends(db.get_db)) -> Dict[str, Any]:
+def encode_cursor(timestamp: datetime, detection_id: uuid.UUID) -> str:
     """
-    Return all detections from the database.
+    Build an opaque keyset cursor pointing just after (timestamp, id).
     """
+    raw = f"{timestamp.isoformat()}|{detection_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        timestamp, detection_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), uuid.UUID(detection_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor."
+        )
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    Turn a comma-separated `fields=` value into a list of detection columns.
+    """
+    if not fields:
+        return DETECTION_FIELDS
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in DETECTION_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return requested
+
+
+@router.get("/", response_model=Dict[str, Any], response_class=FastJSONResponse)
+def get_all_detections(
+    limit: int = Query(DETECTION_PAGE_SIZE, ge=1, le=DETECTION_PAGE_MAX),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(db.get_db)
+) -> Dict[str, Any]:
+    """
+    Return one page of detections ordered by (timestamp, id).
+
+    Pass the returned `next_cursor` back as `cursor` to fetch the following page;
+    it is null on the last page. `fields` is a comma-separated list of columns to
+    return, e.g. fields=tpms_id,timestamp,latitude,longitude.
+    """
+    selected = parse_fields(fields)
+    # The keyset columns are always fetched so the next cursor can be built.
+    columns = detection_columns(selected)
+    columns += [col for col in (Detection.timestamp, Detection.id) if col.key not in selected]
+
+    query = db.query(*columns)
+    if cursor is not None:
+        after_timestamp, after_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Detection.timestamp > after_timestamp,
+            and_(Detection.timestamp == after_timestamp, Detection.id > after_id),
+        ))
+
     try:
-        detections = db.query(Detection).all()
+        rows = query.order_by(Detection.timestamp, Detection.id).limit(limit + 1).all()
     except SQLAlchemyError:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error fetching detections."
         )
     
-    if not detections:
+    if not rows and cursor is None:
+        return {"message": "No detections found"}
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+
+    return FastJSONResponse({"detections": rows_to_dicts(rows, selected), "next_cursor": next_cursor})
+
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def iter_detection_export(filters: List[Any], selected: List[str], fmt: str) -> Iterator[Any]:
+    """
+    Stream detections matching `filters` as NDJSON or CSV text chunks.
+
+    Rows are fetched with yield_per so the database driver uses a server-side cursor
+    where supported; one chunk of output is produced per fetched batch. The session is
+    owned by the generator because it has to outlive the request handler.
+    """
+    statement = (
+        select(*detection_columns(selected))
+        .where(*filters)
+        .order_by(Detection.timestamp, Detection.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(selected)
+        yield buffer.getvalue()
+
+    with SessionLocal() as session:
+        for partition in session.execute(statement).partitions():
+            if fmt == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(partition)
+                yield buffer.getvalue()
+            else:
+                yield dumps_ndjson(partition, selected)
+
+
+@router.get("/export")
+def export_detections(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    tpms_id: Optional[str] = None,
+    tpms_model: Optional[str] = None,
+    car_model: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Stream every matching detection, ordered by timestamp, as NDJSON (one object per
+    line) or CSV. Memory use does not depend on the size of the result.
+    """
+    selected = parse_fields(fields)
+    filters = []
+    if since is not None:
+        filters.append(Detection.timestamp >= since)
+    if until is not None:
+        filters.append(Detection.timestamp < until)
+    if tpms_id is not None:
+        filters.append(Detection.tpms_id == tpms_id.strip())
+    if tpms_model is not None:
+        filters.append(Detection.tpms_model == tpms_model.strip())
+    if car_model is not None:
+        filters.append(Detection.car_model == car_model.strip())
+
+    return StreamingResponse(
+        iter_detection_export(filters, selected, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename=detections.{format}"},
+    )
+
+
+@router.get("/latest", response_model=Dict[str, Any], response_class=FastJSONResponse)
+def get_latest_detections(
+    limit: int = Query(3, ge=1, le=LATEST_BUFFER_SIZE)
+) -> Dict[str, Any]:
+    """
+    Return the latest detections based on their timestamps, newest first.
+
+    Served from the in-memory buffer that every ingest path updates, so no query runs.
+    """
+    latest = latest_detections.latest(limit)
+    if not latest:
         return {"message": "No detections found"}
     
-    # Convert detections to dictionaries
-    detections_data = []
-    for detection in detections:
-        data = detection.__dict__.copy()
-        data.pop('_sa_instance_state', None)
-        detections_data.append(data)
-    
-    return {"detections": detections_data}
+    return FastJSONResponse({"latest": latest})
 
 
-@router.get("/{detection_id}", response_model=Dict[str, Any])
+@router.get("/{detection_id}", response_model=Dict[str, Any], response_class=FastJSONResponse)
 def get_detection_by_id(detection_id: str, db: Session = Depends(db.get_db)) -> Dict[str, Any]:
     """
     Look up a detection by ID from the database.
@@ -49,71 +205,53 @@ def get_detection_by_id(detection_id: str, db: Session = Depends(db.get_db)) ->
             detail="Invalid detection ID format."
         )
     
-    detection = db.query(Detection).filter(Detection.id == detection_uuid).first()
+    detection = db.query(*DETECTION_COLUMNS).filter(Detection.id == detection_uuid).first()
     if detection is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Detection ID {detection_id} not found."
         )
     
-    data = detection.__dict__.copy()
-    data.pop('_sa_instance_state', None)
-    return {"detection": data}
+    return FastJSONResponse({"detection": dict(zip(DETECTION_FIELDS, detection))})
 
 
-@router.get("/latest", response_model=Dict[str, Any])
-def get_latest_detections(db: Session = Depends(db.get_db)) -> Dict[str, Any]:
-    """
-    Return the latest three detections based on their timestamps.
-    """
-    try:
-        latest_detections = (
-            db.query(Detection)
-            .order_by(Detection.timestamp.desc())
-            .limit(3)
-            .all()
-        )
-    except SQLAlchemyError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error fetching latest detections."
-        )
-    
-    if not latest_detections:
-        return {"message": "No detections found"}
-    
-    latest_data = []
-    for detection in latest_detections:
-        data = detection.__dict__.copy()
-        data.pop('_sa_instance_state', None)
-        latest_data.append(data)
-    
-    return {"latest": latest_data}
-
 @router.post("/", response_model=Dict[str, Any])
 def create_detection(
     detection_in: DetectionCreate,
+    dedupe: bool = Query(False),
+    db: Session = Depends(db.get_db)
 ) -> Dict[str, Any]:
-    new_detection = Detection(
-        id=uuid.uuid4(),
-        timestamp=detection_in.timestamp,
-        tpms_id=detection_in.tpms_id,
-        tpms_model=detection_in.tpms_model,
-        car_model=detection_in.car_model,
-        location=detection_in.location,
-        latitude=detection_in.latitude,
-        longitude=detection_in.longitude,
-    )
+    """
+    Store a single detection. With dedupe=true a detection whose
+    (tpms_id, timestamp, location) is already stored is skipped. Dedupe is
+    best-effort: concurrent writers of the same detection can both store it.
+    """
+    return create_detection_logic(detection_in, db, dedupe=dedupe)
 
-    try:
-        db.add(new_detection)
-        db.commit()
-        db.refresh(new_detection)
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create detection."
-        ) from e
 
-    return {"id": str(new_detection.id), "message": "Detection created successfully."}
+@router.post("/batch", response_model=Dict[str, Any])
+def create_detections_batch(
+    detections_in: List[Dict[str, Any]] = Body(...),
+    dedupe: bool = Query(False),
+    db: Session = Depends(db.get_db)
+) -> Dict[str, Any]:
+    """
+    Store up to DETECTION_BATCH_MAX detections in a single transaction.
+
+    Items use the same fields as POST /api/detection/, all of them required. They are
+    validated together; invalid or incomplete items (and, with dedupe=true, already
+    stored ones) are skipped and reported in the per-item `items` list instead of
+    failing the whole request. As for POST /api/detection/, dedupe is best-effort
+    under concurrent writes.
+    """
+    if not detections_in:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one detection is required."
+        )
+    if len(detections_in) > DETECTION_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {DETECTION_BATCH_MAX} detections."
+        )
+    return create_detections_batch_logic(detections_in, db, dedupe=dedupe)
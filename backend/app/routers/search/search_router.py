@@ -1,18 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from sqlalchemy import String, any_, bindparam, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import datetime
+from itertools import groupby
+from typing import List, Dict, Any, Iterator, Optional
+import orjson
 from database import db
+from database.db import SessionLocal
+from background_tasks import search_cache, tpms_model_index, car_model_index
 from models.models import Detection
+from utils.geo import cell_ranges_for_bbox
+from utils.serialization import DETECTION_FIELDS, DETECTION_COLUMNS, FastJSONResponse, detection_columns, rows_to_dicts
+from schemas.search_schema import IdSearchRequest
+from config import AREA_SEARCH_LIMIT, AREA_SEARCH_MAX, EXPORT_BATCH_SIZE, SEARCH_IDS_MAX, MODEL_FUZZY_THRESHOLD
 
-search_router = APIRouter(prefix="/api/search", tags=["Search"])
+search_router = APIRouter(prefix="/api/search", tags=["Search"], default_response_class=FastJSONResponse)
 
-def serialize_detection(detection: Detection) -> Dict[str, Any]:
+SUMMARY_FIELDS = ["timestamp", "location", "latitude", "longitude"]
+# Boxes spanning more grid rows than this are scanned as one geo_cell range instead of
+# one range per row, keeping the statement small; the exact coordinate filter still applies.
+MAX_CELL_RANGES = 64
+
+def find_by_models(db: Session, column: Any, models: List[str]) -> List[Dict[str, Any]]:
     """
-    Convert a Detection model instance into a dictionary.
+    Return the detections whose `column` equals one of `models`, the exact names an
+    n-gram index resolved a search to. No query runs when nothing matched.
     """
-    data = detection.__dict__.copy()
-    data.pop("_sa_instance_state", None)
-    return data
+    if not models:
+        return []
+    rows = db.query(*DETECTION_COLUMNS).filter(column.in_(models)).all()
+    return rows_to_dicts(rows)
 
 @search_router.get("/ids", response_model=Dict[str, Any])
 def search_by_ids(
@@ -25,35 +44,75 @@ def search_by_ids(
     Example URL: /api/search/ids?ids[]=123&ids[]=456
     """
     # Trim whitespace from each ID.
-    trimmed_ids = [id.strip() for id in ids]
-    detections = db.query(Detection).filter(Detection.tpms_id.in_(trimmed_ids)).all()
+    trimmed_ids = sorted({id.strip() for id in ids})
+    key = ("ids", tuple(trimmed_ids))
+    detections = search_cache.get(key)
+    if detections is None:
+        generation = search_cache.generation()
+        rows = db.query(*DETECTION_COLUMNS).filter(Detection.tpms_id.in_(trimmed_ids)).all()
+        detections = rows_to_dicts(rows)
+        search_cache.put(key, detections, generation, tpms_ids=trimmed_ids)
     if not detections:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No detections found for the provided IDs."
         )
-    return {"detections": [serialize_detection(det) for det in detections]}
+    return FastJSONResponse({"detections": detections})
 
 @search_router.get("/model/{model_name}", response_model=Dict[str, Any])
 def search_by_model(
     model_name: str,
+    fuzzy: bool = False,
     db: Session = Depends(db.get_db)
 ) -> Dict[str, Any]:
     """
-    Search detections by sensor model.
+    Search detections by sensor model. Matches models containing `model_name`
+    (case-insensitive), or with fuzzy=true models similar to it.
     Example URL: /api/search/model/ABC123
     """
     # Trim any extra whitespace from the model name.
     model_name = model_name.strip()
-    detections = db.query(Detection).filter(
-        Detection.tpms_model.ilike(f"%{model_name}%")
-    ).all()
+    if fuzzy:
+        # Fuzzy matches are not cached: substring invalidation does not cover them.
+        matches = tpms_model_index.similar(model_name, MODEL_FUZZY_THRESHOLD)
+        detections = find_by_models(db, Detection.tpms_model, matches)
+    else:
+        # Matching is case-insensitive, so differently cased names share one entry.
+        key = ("model", model_name.lower())
+        detections = search_cache.get(key)
+        if detections is None:
+            generation = search_cache.generation()
+            detections = find_by_models(db, Detection.tpms_model, tpms_model_index.substring(model_name))
+            search_cache.put(key, detections, generation, model=model_name)
     if not detections:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No detections found for the given model."
         )
-    return {"detections": [serialize_detection(det) for det in detections]}
+    return FastJSONResponse({"detections": detections})
+
+@search_router.get("/car/{car_model}", response_model=Dict[str, Any])
+def search_by_car_model(
+    car_model: str,
+    fuzzy: bool = False,
+    db: Session = Depends(db.get_db)
+) -> Dict[str, Any]:
+    """
+    Search detections by car model, by substring or with fuzzy=true by similarity.
+    Example URL: /api/search/car/Accord
+    """
+    car_model = car_model.strip()
+    matches = (
+        car_model_index.similar(car_model, MODEL_FUZZY_THRESHOLD) if fuzzy
+        else car_model_index.substring(car_model)
+    )
+    detections = find_by_models(db, Detection.car_model, matches)
+    if not detections:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No detections found for the given car model."
+        )
+    return FastJSONResponse({"detections": detections})
 
 @search_router.get("/model/{model_name}/id/{tpms_id}", response_model=Dict[str, Any])
 def search_by_model_and_id(
@@ -67,16 +126,17 @@ def search_by_model_and_id(
     """
     model_name = model_name.strip()
     tpms_id = tpms_id.strip()
-    detections = db.query(Detection).filter(
-        Detection.tpms_model.ilike(f"%{model_name}%"),
+    matches = tpms_model_index.substring(model_name)
+    detections = db.query(*DETECTION_COLUMNS).filter(
+        Detection.tpms_model.in_(matches),
         Detection.tpms_id == tpms_id
-    ).all()
+    ).all() if matches else []
     if not detections:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No detections found for the given model and id."
         )
-    return {"detections": [serialize_detection(det) for det in detections]}
+    return FastJSONResponse({"detections": rows_to_dicts(detections)})
 
 @search_router.get("/ids/summary", response_model=Dict[str, Any])
 def search_ids_summary(
@@ -90,21 +150,126 @@ def search_ids_summary(
     Example URL: /api/search/ids/summary?ids[]=123&ids[]=456
     """
     # Trim whitespace from each ID.
-    trimmed_ids = [id.strip() for id in ids]
-    detections = db.query(Detection).filter(Detection.tpms_id.in_(trimmed_ids)).all()
+    trimmed_ids = sorted({id.strip() for id in ids})
+    key = ("ids/summary", tuple(trimmed_ids))
+    detections = search_cache.get(key)
+    if detections is None:
+        generation = search_cache.generation()
+        rows = (
+            db.query(*detection_columns(SUMMARY_FIELDS))
+            .filter(Detection.tpms_id.in_(trimmed_ids))
+            .all()
+        )
+        # Keep only the desired fields.
+        detections = rows_to_dicts(rows, SUMMARY_FIELDS)
+        search_cache.put(key, detections, generation, tpms_ids=trimmed_ids)
     if not detections:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No detections found for the provided IDs."
         )
-    # Return only the desired fields.
-    summary = [
-        {
-            "timestamp": det.timestamp,
-            "location": det.location,
-            "latitude": det.latitude,
-            "longitude": det.longitude,
-        }
-        for det in detections
-    ]
-    return {"detections": summary}
+    return FastJSONResponse({"detections": detections})
+
+def iter_id_groups(ids: List[str], fields: List[str]) -> Iterator[bytes]:
+    """
+    Stream the detections of every id in `ids` as NDJSON, one line per tpms_id:
+    {"tpms_id": ..., "detections": [...]}.
+
+    All ids go to the database in a single statement: one array parameter on
+    PostgreSQL (tpms_id = ANY(:ids)), an IN list elsewhere. Rows arrive ordered by
+    (tpms_id, timestamp) through yield_per, so each group is written as soon as it is
+    complete. The session is owned by the generator because it has to outlive the
+    request handler.
+    """
+    with SessionLocal() as session:
+        if session.get_bind().dialect.name == "postgresql":
+            id_filter = Detection.tpms_id == any_(bindparam("ids", ids, type_=ARRAY(String)))
+        else:
+            id_filter = Detection.tpms_id.in_(ids)
+        statement = (
+            select(Detection.tpms_id, *detection_columns(fields))
+            .where(id_filter)
+            .order_by(Detection.tpms_id, Detection.timestamp)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        rows = session.execute(statement)
+        for tpms_id, group in groupby(rows, key=lambda row: row[0]):
+            detections = [dict(zip(fields, row[1:])) for row in group]
+            yield orjson.dumps({"tpms_id": tpms_id, "detections": detections}) + b"\n"
+
+@search_router.post("/ids")
+def search_by_id_set(request: IdSearchRequest):
+    """
+    Search detections for up to SEARCH_IDS_MAX tpms_id values in one request.
+    Results are streamed as NDJSON grouped per tpms_id; ids without detections are
+    omitted.
+    Example body: {"ids": ["TPMS123", "TPMS456"], "summary": false}
+    """
+    trimmed_ids = sorted({id.strip() for id in request.ids if id.strip()})
+    if not trimmed_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one tpms_id is required."
+        )
+    if len(trimmed_ids) > SEARCH_IDS_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {SEARCH_IDS_MAX} ids can be searched at once."
+        )
+    fields = SUMMARY_FIELDS if request.summary else DETECTION_FIELDS
+    return StreamingResponse(iter_id_groups(trimmed_ids, fields), media_type="application/x-ndjson")
+
+@search_router.get("/cache/stats", response_model=Dict[str, Any])
+def search_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters and size of the search result cache.
+    """
+    return FastJSONResponse(search_cache.stats())
+
+@search_router.get("/area", response_model=Dict[str, Any])
+def search_by_area(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(AREA_SEARCH_LIMIT, ge=1, le=AREA_SEARCH_MAX),
+    db: Session = Depends(db.get_db)
+) -> Dict[str, Any]:
+    """
+    Search detections inside a bounding box, optionally within a time window,
+    oldest first.
+    Example URL: /api/search/area?min_lat=42.33&min_lon=-71.10&max_lat=42.37&max_lon=-71.05&since=2023-06-15T00:00:00
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_lat/min_lon must not exceed max_lat/max_lon."
+        )
+    if since is not None and until is not None and since > until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since must not be later than until."
+        )
+
+    # Coarse filter on the indexed grid cells, then the exact box on the candidates.
+    ranges = cell_ranges_for_bbox(min_lat, min_lon, max_lat, max_lon)
+    if len(ranges) > MAX_CELL_RANGES:
+        ranges = [(ranges[0][0], ranges[-1][1])]
+    query = db.query(*DETECTION_COLUMNS).filter(
+        or_(*(Detection.geo_cell.between(first, last) for first, last in ranges)),
+        Detection.latitude.between(min_lat, max_lat),
+        Detection.longitude.between(min_lon, max_lon),
+    )
+    if since is not None:
+        query = query.filter(Detection.timestamp >= since)
+    if until is not None:
+        query = query.filter(Detection.timestamp <= until)
+    detections = query.order_by(Detection.timestamp).limit(limit).all()
+    if not detections:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No detections found in the given area."
+        )
+    return FastJSONResponse({"detections": rows_to_dicts(detections)})
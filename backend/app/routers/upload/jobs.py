@@ -0,0 +1,132 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable
+from routers.upload.validation import ValidationReport
+from config import INGEST_MAX_WORKERS, INGEST_MAX_QUEUED, INGEST_JOB_RETENTION
+
+
+class IngestJob:
+    def __init__(self, filename: str):
+        """
+        Track the state of one background CSV ingest.
+
+        Parameters:
+            filename (str): Name of the uploaded file, reported back to clients.
+        """
+        self.job_id: str = str(uuid.uuid4())
+        self.filename = filename
+        self.timestamp = datetime.now()
+        self.status = "queued"
+        self.rows_processed = 0
+        self.report = ValidationReport()
+        self.error: Optional[str] = None
+        self.results: Optional[Dict[str, Any]] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def start(self):
+        self.status = "running"
+        self._started = time.perf_counter()
+
+    def record_progress(self, rows: int):
+        """
+        Add `rows` to the processed row count. Called after every written batch.
+        """
+        self.rows_processed += rows
+
+    def complete(self, results: Dict[str, Any]):
+        self.results = results
+        self.status = "completed"
+        self._finished = time.perf_counter()
+
+    def fail(self, error: str):
+        self.error = error
+        self.status = "failed"
+        self._finished = time.perf_counter()
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        if self._started is None:
+            return None
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_status(self) -> Dict[str, Any]:
+        status = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "filename": self.filename,
+            "timestamp": self.timestamp,
+            "rows_processed": self.rows_processed,
+            "rows_per_second": self.rows_per_second,
+            "errors": self.report.to_dict(),
+        }
+        if self.status == "completed":
+            status["stats"] = self.results["stats"]
+            status["vehicle_count"] = len(self.results.get("vehicles", []))
+        elif self.status == "failed":
+            status["error"] = self.error
+        return status
+
+
+class IngestJobManager:
+    def __init__(self, max_workers: int, max_queued: int, retention: int):
+        """
+        Run ingest jobs on a bounded thread pool and keep the most recent ones for lookup.
+
+        Parameters:
+            max_workers (int): Number of jobs that may run concurrently.
+            max_queued (int): Maximum number of queued or running jobs before new
+                submissions are refused.
+            retention (int): Number of jobs kept in memory; the oldest finished jobs
+                are forgotten first.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_queued = max_queued
+        self.retention = retention
+
+    def submit(self, filename: str, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> Optional[IngestJob]:
+        """
+        Queue `func(job, *args, **kwargs)` and return its job, or None when the queue is full.
+        The value returned by `func` becomes the job results.
+        """
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.is_active)
+            if active >= self.max_queued:
+                return None
+            job = IngestJob(filename)
+            self._jobs[job.job_id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job, func, *args, **kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: IngestJob, func: Callable[..., Dict[str, Any]], *args, **kwargs):
+        job.start()
+        try:
+            job.complete(func(job, *args, **kwargs))
+        except Exception as e:
+            job.fail(str(getattr(e, "detail", e)))
+
+    def _prune(self):
+        # Forget the oldest finished jobs once the retention limit is exceeded.
+        excess = len(self._jobs) - self.retention
+        for job_id in [jid for jid, job in self._jobs.items() if not job.is_active][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+
+ingest_jobs = IngestJobManager(INGEST_MAX_WORKERS, INGEST_MAX_QUEUED, INGEST_JOB_RETENTION)
@@ -1,123 +1,96 @@
-from fastapi import APIRouter, File, UploadFile, BackgroundTasks, HTTPException, Depends
-from datetime import datetime
+import os
+import shutil
+import tempfile
+from fastapi import APIRouter, File, UploadFile, BackgroundTasks, HTTPException, Depends, Query, status
 from database import db
 from models.models import Detection
 from sqlalchemy.orm import Session
 from routers.detection.detection_router import create_detection
-from routers.upload.utils import create_detection_logic
+from routers.upload.utils import create_detection_logic, run_csv_ingest
+from routers.upload.jobs import IngestJob, ingest_jobs
 from schemas.detections_schema import DetectionCreate
+from config import UPLOAD_BATCH_SIZE
 
 upload_router = APIRouter(prefix="/api/upload", tags=["Upload"])
 
+SPOOL_CHUNK_SIZE = 1024 * 1024
 
-@upload_router.post("/csv")
-async def upload_csv(
+
+@upload_router.post("/csv", status_code=status.HTTP_202_ACCEPTED)
+def upload_csv(
     file: UploadFile = File(...),
-    db: Session = Depends(db.get_db)
+    batch_size: int = Query(UPLOAD_BATCH_SIZE, ge=1),
+    group_vehicles: bool = Query(False),
+    dedupe: bool = Query(False),
 ):
+    """
+    Queue a CSV ingest job and return its job ID immediately.
+
+    The upload is spooled to a temporary file and processed on the ingest worker
+    pool; poll /status/{job_id} for progress. With group_vehicles=true the job also
+    runs vehicle grouping, whose output is served by /vehicles and /network.
+    With dedupe=true rows already stored under the same (tpms_id, timestamp, location)
+    are skipped, so re-uploading a file is harmless. Dedupe is best-effort: uploads or
+    /api/detection writes running at the same time may still store the same detection.
+    """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are accepted")
 
-    contents = await file.read()
-    lines = contents.decode().splitlines()
-    header = lines[0].split(",")
-    
-    for row in lines[1:]:
-        if not row.strip():
-            continue
-        values = row.split(",")
-        data = dict(zip(header, values))
-        
-        detection_create = DetectionCreate(
-            timestamp=datetime.fromisoformat(
-                data.get("timestamp", datetime.now().isoformat())
-            ),
-            tpms_id=data.get("tpms_id", ""),
-            tpms_model=data.get("tpms_model", ""),
-            car_model=data.get("car_model", ""),
-            location=data.get("location", ""),
-            latitude=float(data.get("latitude", 0.0)),
-            longitude=float(data.get("longitude", 0.0)),
-            signal_strength=float(data.get("signal_strength", 0.0))
-            if "signal_strength" in data else 0.0
+    # Copy the upload in chunks; the request's file handle is closed once we return.
+    with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as spool:
+        shutil.copyfileobj(file.file, spool, SPOOL_CHUNK_SIZE)
+
+    job = ingest_jobs.submit(file.filename, run_csv_ingest, spool.name, batch_size, group_vehicles, dedupe)
+    if job is None:
+        os.remove(spool.name)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many ingest jobs in progress. Try again later."
         )
-        # Use the helper function with the injected db session
-        create_detection_logic(detection_create, db)
-    
-    return {"message": "CSV processing initiated."}
-
-
-
-    
-# @upload_router.get("/status/{job_id}")
-# async def get_processing_status(job_id: str):
-#     """Check the status of a CSV processing job"""
-#     if job_id not in processed_results:
-#         raise HTTPException(status_code=404, detail="Job not found")
-    
-#     job = processed_results[job_id]
-    
-#     # If job is complete, include paths and vehicle groups in the response
-#     if job["status"] == "completed":
-#         return {
-#             "status": job["status"],
-#             "filename": job["filename"],
-#             "timestamp": job["timestamp"],
-#             "stats": job["results"]["stats"],
-#             "vehicle_count": len(job["results"]["vehicles"])
-#         }
-#     elif job["status"] == "failed":
-#         return {
-#             "status": job["status"],
-#             "filename": job["filename"],
-#             "timestamp": job["timestamp"],
-#             "error": job["error"]
-#         }
-#     else:
-#         return {
-#             "status": job["status"],
-#             "filename": job["filename"],
-#             "timestamp": job["timestamp"]
-#         }
-
-# @upload_router.get("/results/{job_id}")
-# async def get_processing_results(job_id: str):
-#     """Get the full results of a completed CSV processing job"""
-#     if job_id not in processed_results:
-#         raise HTTPException(status_code=404, detail="Job not found")
-    
-#     job = processed_results[job_id]
-    
-#     if job["status"] != "completed":
-#         raise HTTPException(status_code=400, 
-#                            detail=f"Job is not completed. Current status: {job['status']}")
-    
-#     return job["results"]
-
-# @upload_router.get("/vehicles/{job_id}")
-# async def get_vehicle_groups(job_id: str):
-#     """Get just the vehicle groups from a completed job"""
-#     if job_id not in processed_results:
-#         raise HTTPException(status_code=404, detail="Job not found")
-    
-#     job = processed_results[job_id]
-    
-#     if job["status"] != "completed":
-#         raise HTTPException(status_code=400, 
-#                            detail=f"Job is not completed. Current status: {job['status']}")
-    
-#     return {"vehicles": job["results"]["vehicles"]}
-
-# @upload_router.get("/network/{job_id}")
-# async def get_network(job_id: str):
-#     """Get the TPMSNetwork from a completed job"""
-#     if job_id not in processed_results:
-#         raise HTTPException(status_code=404, detail="Job not found")
-    
-#     job = processed_results[job_id]
-    
-#     if job["status"] != "completed":
-#         raise HTTPException(status_code=400, 
-#                            detail=f"Job is not completed. Current status: {job['status']}")
-    
-#     return {"network": job["results"]["network"]}
\ No newline at end of file
+
+    return {"message": "CSV processing initiated.", "job_id": job.job_id, "status": job.status}
+
+
+def get_job(job_id: str) -> IngestJob:
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def get_completed_job(job_id: str) -> IngestJob:
+    job = get_job(job_id)
+    if job.status != "completed":
+        raise HTTPException(status_code=400, 
+                           detail=f"Job is not completed. Current status: {job.status}")
+    return job
+
+
+@upload_router.get("/status/{job_id}")
+def get_processing_status(job_id: str):
+    """Check the status of a CSV processing job"""
+    return get_job(job_id).to_status()
+
+
+@upload_router.get("/results/{job_id}")
+def get_processing_results(job_id: str):
+    """Get the full results of a completed CSV processing job"""
+    return get_completed_job(job_id).results
+
+
+@upload_router.get("/vehicles/{job_id}")
+def get_vehicle_groups(job_id: str):
+    """Get just the vehicle groups from a completed job"""
+    job = get_completed_job(job_id)
+    if "vehicles" not in job.results:
+        raise HTTPException(status_code=400, detail="Vehicle grouping was not requested for this job")
+    return {"vehicles": job.results["vehicles"]}
+
+
+@upload_router.get("/network/{job_id}")
+def get_network(job_id: str):
+    """Get the TPMSNetwork from a completed job"""
+    job = get_completed_job(job_id)
+    if "network" not in job.results:
+        raise HTTPException(status_code=400, detail="Vehicle grouping was not requested for this job")
+    return {"network": job.results["network"]}
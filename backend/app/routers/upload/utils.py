@@ -1,23 +1,83 @@
+import os
+import time
 import uuid
-from typing import Dict, Any
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator, List, Optional, BinaryIO, Callable, Set, Tuple
+import pandas as pd
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException, status
 from models.models import Detection
+from database.db import SessionLocal
+from DS import TPMSGraph, TPMSNetwork, RecentDetections, DetectionRollups
+from background_tasks import (
+    latest_detections,
+    search_cache,
+    tpms_model_index,
+    car_model_index,
+    detection_rollups,
+    note_written_detections,
+)
 from schemas.detections_schema import DetectionCreate
+from routers.upload.validation import ValidationReport, validate_detection_chunk
+from utils.geo import geo_cell
+from utils.serialization import DETECTION_FIELDS
+from utils.timestamps import to_naive_utc
+from config import UPLOAD_BATCH_SIZE
 
 
-def create_detection_logic(detection_in: DetectionCreate, db: Session) -> Dict[str, Any]:
-    new_detection = Detection(
-        id=uuid.uuid4(),
-        timestamp=detection_in.timestamp,
-        tpms_id=detection_in.tpms_id,
-        tpms_model=detection_in.tpms_model,
-        car_model=detection_in.car_model,
-        location=detection_in.location,
-        latitude=detection_in.latitude,
-        longitude=detection_in.longitude,
+def detection_key(row: Dict[str, Any]) -> Tuple[str, datetime, str]:
+    """
+    Natural key of a detection: the same sensor seen at the same place and time.
+    """
+    return (row["tpms_id"], row["timestamp"], row["location"])
+
+
+def drop_duplicate_detections(rows: List[Dict[str, Any]], db: Session) -> List[Dict[str, Any]]:
+    """
+    Remove rows whose natural key repeats within `rows` or already exists in the database.
+
+    Existing keys are fetched with one query bounded by the batch's tpms_ids and time
+    range, so earlier batches written in the same transaction are seen as well. Rows
+    committed by another transaction after that query are not, so concurrent dedupe
+    writes can both insert a key. The natural key cannot be a unique index (and the
+    insert ON CONFLICT DO NOTHING) because ingest without dedupe stores duplicates by
+    design.
+    """
+    seen: Set[Tuple[str, datetime, str]] = set()
+    unique = []
+    for row in rows:
+        key = detection_key(row)
+        if key not in seen:
+            seen.add(key)
+            unique.append(row)
+    if not unique:
+        return unique
+
+    timestamps = [row["timestamp"] for row in unique]
+    existing = set(
+        db.query(Detection.tpms_id, Detection.timestamp, Detection.location)
+        .filter(
+            Detection.tpms_id.in_({row["tpms_id"] for row in unique}),
+            Detection.timestamp.between(min(timestamps), max(timestamps)),
+        )
+        .all()
     )
+    if not existing:
+        return unique
+    return [row for row in unique if detection_key(row) not in existing]
+
+
+def create_detection_logic(detection_in: DetectionCreate, db: Session, dedupe: bool = False) -> Dict[str, Any]:
+    row = detection_to_row(detection_in)
+    if dedupe and not drop_duplicate_detections([row], db):
+        return {"id": None, "message": "Detection already exists.", "inserted": 0, "skipped": 1}
+
+    new_detection = Detection(**row)
+    written = WrittenDetections()
+    written.record([row])
 
     try:
         db.add(new_detection)
@@ -30,265 +90,439 @@ def create_detection_logic(detection_in: DetectionCreate, db: Session) -> Dict[s
             detail="Failed to create detection."
         ) from e
 
-    return {"id": str(new_detection.id), "message": "Detection created successfully."}
-# from fastapi import APIRouter
-# import pandas as pd
-# from typing import List, Dict, Any
-# from DS import TPMSNetwork, TPMSGraph
+    written.publish()
+    return {"id": str(new_detection.id), "message": "Detection created successfully.", "inserted": 1, "skipped": 0}
+
+
+# Fields of DetectionCreate; batch items must carry all of them.
+DETECTION_CREATE_FIELDS = ["timestamp", "tpms_id", "tpms_model", "car_model", "location", "latitude", "longitude"]
+
+
+def create_detections_batch_logic(items: List[Dict[str, Any]], db: Session, dedupe: bool = False) -> Dict[str, Any]:
+    """
+    Validate a batch of raw detection payloads together and store the valid ones in
+    one transaction.
+
+    Items lacking any DetectionCreate field (or with a null one) are rejected as
+    "missing_<field>" rather than filled in with defaults.
+
+    Returns insert/skip/reject counts and a status per input item, in input order:
+    "created" (with the new id), "invalid" (with the failed check) or "duplicate".
+    """
+    # Every field is required, as for POST /api/detection/. Incomplete items are
+    # rejected here so the CSV validator never fills in its upload defaults.
+    rejected: Dict[int, Dict[str, Any]] = {}
+    complete: List[int] = []
+    for index, item in enumerate(items):
+        missing = next((f for f in DETECTION_CREATE_FIELDS if item.get(f) is None), None)
+        if missing is None:
+            complete.append(index)
+        else:
+            rejected[index] = {"row": index, "reason": f"missing_{missing}", "value": None}
+
+    report = ValidationReport(sample_limit=len(items))
+    rows = validate_detection_chunk(
+        pd.DataFrame.from_records([items[i] for i in complete], columns=DETECTION_CREATE_FIELDS), 0, report
+    )
+    for r in report.samples:
+        rejected[complete[r["row"]]] = r
+    valid_indexes = [i for i in complete if i not in rejected]
+
+    to_insert = drop_duplicate_detections(rows, db) if dedupe else rows
+    stats = bulk_insert_detections(to_insert, db, batch_size=max(len(to_insert), 1))
+    created = {row["id"] for row in to_insert}
+
+    statuses: List[Dict[str, Any]] = [None] * len(items)
+    for index, row in zip(valid_indexes, rows):
+        if row["id"] in created:
+            statuses[index] = {"index": index, "status": "created", "id": str(row["id"])}
+        else:
+            statuses[index] = {"index": index, "status": "duplicate"}
+    for index, rejection in rejected.items():
+        statuses[index] = {
+            "index": index, "status": "invalid", "reason": rejection["reason"], "value": rejection["value"]
+        }
+
+    return {
+        "inserted": stats["rows_inserted"],
+        "skipped": len(rows) - len(to_insert),
+        "rejected": len(rejected),
+        "items": statuses,
+    }
+
+
+def detection_to_row(detection_in: DetectionCreate) -> Dict[str, Any]:
+    """
+    Convert a validated DetectionCreate into a column mapping for a bulk insert.
+    Timezone-aware timestamps are stored as naive UTC, as CSV uploads are.
+    """
+    return {
+        "id": uuid.uuid4(),
+        "timestamp": to_naive_utc(detection_in.timestamp),
+        "tpms_id": detection_in.tpms_id,
+        "tpms_model": detection_in.tpms_model,
+        "car_model": detection_in.car_model,
+        "location": detection_in.location,
+        "latitude": detection_in.latitude,
+        "longitude": detection_in.longitude,
+        "geo_cell": geo_cell(detection_in.latitude, detection_in.longitude),
+    }
+
+
+class WrittenDetections:
+    def __init__(self):
+        """
+        What in-memory readers need to learn about the detections written by one
+        transaction. Rows are recorded as they are inserted and `publish` applies the
+        effects once the transaction has committed. Memory stays bounded by the
+        latest-buffer capacity, the distinct names and the rollup buckets touched.
+        """
+        self.recent = RecentDetections(latest_detections.capacity)
+        self.tpms_ids: Set[str] = set()
+        self.models: Set[str] = set()
+        self.car_models: Set[str] = set()
+        self.rollups = DetectionRollups()
+        self.oldest: Optional[datetime] = None
+
+    def record(self, rows: List[Dict[str, Any]]):
+        self.recent.extend(rows)
+        for row in rows:
+            self.tpms_ids.add(row["tpms_id"])
+            self.models.add(row["tpms_model"])
+            self.car_models.add(row["car_model"])
+            self.rollups.add(row)
+            if self.oldest is None or row["timestamp"] < self.oldest:
+                self.oldest = row["timestamp"]
+
+    def publish(self):
+        """
+        Push the newest rows into the latest-detections buffer, index new model names
+        for model search, fold the rollups into the dashboard ones and drop cached
+        searches for the written sensors/models. Detections older than the
+        network watermark schedule a full network rebuild.
+        """
+        latest_detections.extend(public_fields(row) for row in self.recent.latest())
+        tpms_model_index.update(self.models)
+        car_model_index.update(self.car_models)
+        detection_rollups.merge(self.rollups)
+        search_cache.invalidate(self.tpms_ids, self.models)
+        if self.oldest is not None:
+            note_written_detections(self.oldest)
+
+
+def public_fields(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drop internal columns (e.g. geo_cell) from an insert mapping before it is served.
+    """
+    return {field: row[field] for field in DETECTION_FIELDS}
+
+
+def iter_csv_chunks(
+    fileobj: BinaryIO,
+    chunk_size: int = UPLOAD_BATCH_SIZE,
+    usecols: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV file object as DataFrames of at most `chunk_size` rows.
+
+    The file is consumed incrementally by the pandas parser, so memory use depends on
+    the chunk size rather than on the file size. Every column is read as a string;
+    quoted fields (including embedded commas and newlines) are handled by the parser.
+    """
+    try:
+        reader = pd.read_csv(
+            fileobj,
+            chunksize=chunk_size,
+            usecols=usecols,
+            dtype=str,
+            keep_default_na=False,
+        )
+    except pd.errors.EmptyDataError:
+        return
+
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def validated_detection_rows(
+    chunks: Iterable[pd.DataFrame],
+    report: ValidationReport,
+    collect: Optional[List[Dict[str, Any]]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Validate streamed CSV chunks column-wise and yield only the clean detection rows.
+    Rejected rows are recorded in `report` instead of aborting the upload. If
+    `collect` is given, the clean rows are also appended to it.
+    """
+    first_row = 1
+    for chunk in chunks:
+        rows = validate_detection_chunk(chunk, first_row, report)
+        if collect is not None:
+            collect.extend(rows)
+        yield from rows
+        first_row += len(chunk)
+
 
-# df = pd.DataFrame() 
-# graph = TPMSGraph(df)
+def bulk_insert_detections(
+    rows: Iterable[Dict[str, Any]],
+    db: Session,
+    batch_size: int = UPLOAD_BATCH_SIZE,
+    on_batch: Optional[Callable[[int], None]] = None,
+    dedupe: bool = False
+) -> Dict[str, Any]:
+    """
+    Insert detection rows in batches of `batch_size`.
 
-# upload_router = APIRouter(prefix="/api/upload", tags=["Data Upload"])
+    Each batch is written with a single multi-row INSERT and all batches share one
+    transaction, so either the whole upload is stored or none of it is.
+    `on_batch`, if given, is called with the size of every batch once it is written.
+    With `dedupe`, rows whose (tpms_id, timestamp, location) is already stored or
+    repeated in the batch are skipped.
 
-# processed_results = {}
+    Returns a summary with the number of rows written and skipped and the throughput.
+    """
+    start = time.perf_counter()
+    inserted = 0
+    skipped = 0
+    batch: List[Dict[str, Any]] = []
+    written = WrittenDetections()
 
-# def parse_timestamp(timestamp_str):
-#     """Convert timestamp string to datetime object"""
-#     try:
-#         return pd.to_datetime(timestamp_str)
-#     except:
-#         raise ValueError(f"Invalid timestamp format: {timestamp_str}")
+    def write_batch() -> int:
+        to_insert = drop_duplicate_detections(batch, db) if dedupe else batch
+        if to_insert:
+            db.execute(insert(Detection), to_insert)
+            written.record(to_insert)
+        if on_batch is not None:
+            on_batch(len(batch))
+        return len(to_insert)
 
-# def process_vehicle_groups(df: pd.DataFrame, time_threshold: int = 5, weight_threshold: int = 2) -> Dict[str, Any]:
-#     """
-#     Process TPMS data to identify vehicle groups using co-occurrence graph algorithm.
-#     This function expects the data to be already filtered for a specific car model or sensor ID if needed.
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                count = write_batch()
+                inserted += count
+                skipped += len(batch) - count
+                batch = []
+        if batch:
+            count = write_batch()
+            inserted += count
+            skipped += len(batch) - count
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to store detections."
+        ) from e
+
+    written.publish()
+    elapsed = time.perf_counter() - start
+    return {
+        "rows_inserted": inserted,
+        "rows_skipped": skipped,
+        "batch_size": batch_size,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round((inserted + skipped) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+GROUPING_COLUMNS = ["timestamp", "tpms_id", "tpms_model", "car_model", "location", "latitude", "longitude"]
+
+
+def process_vehicle_groups(df: pd.DataFrame, time_threshold: int = 5, weight_threshold: int = 2) -> Dict[str, Any]:
+    """
+    Process TPMS data to identify vehicle groups using co-occurrence graph algorithm.
+    This function expects the data to be already filtered for a specific car model or sensor ID if needed.
     
-#     Parameters:
-#         df: Pandas DataFrame containing the TPMS readings
-#         time_threshold: Time threshold in seconds for co-occurrence
-#         weight_threshold: Weight threshold for edge pruning
+    Parameters:
+        df: Pandas DataFrame containing the TPMS readings
+        time_threshold: Time threshold in seconds for co-occurrence
+        weight_threshold: Weight threshold for edge pruning
         
-#     Returns:
-#         Dictionary with vehicle grouping results
-#     """
-#     # Ensure required columns exist
-#     required_columns = ['timestamp', 'tpms_id', 'location']
-#     missing_columns = [col for col in required_columns if col not in df.columns]
-    
-#     if missing_columns:
-#         raise ValueError(f"DataFrame is missing required columns: {', '.join(missing_columns)}")
+    Returns:
+        Dictionary with vehicle grouping results
+    """
+    # Ensure required columns exist
+    required_columns = ['timestamp', 'tpms_id', 'location']
+    missing_columns = [col for col in required_columns if col not in df.columns]
     
-#     # Convert timestamp to datetime if it's not already
-#     if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
-#         df['timestamp'] = df['timestamp'].apply(parse_timestamp)
+    if missing_columns:
+        raise ValueError(f"DataFrame is missing required columns: {', '.join(missing_columns)}")
     
-#     # Build co-occurrence graph
-#     G = graph.build_cooccurrence_graph(df, time_threshold)
+    # Build co-occurrence graph
+    graph = TPMSGraph(df)
+    graph.build_graph(time_threshold=time_threshold)
     
-#     # Find vehicle groups
-#     vehicle_groups = graph.find_vehicle_groups(G, weight_threshold)
+    # Find vehicle groups
+    groups_with_weights = graph.find_vehicle_groups(weight_threshold=weight_threshold) or []
     
-#     # Calculate confidence scores
-#     confidence_scores = graph.calculate_confidence_scores(G, vehicle_groups)
+    # Calculate confidence scores
+    confidence_scores = graph.calculate_confidence_scores() or {}
     
-#     return {
-#         "graph": G,
-#         "vehicle_groups": vehicle_groups,
-#         "confidence_scores": confidence_scores
-#     }
+    return {
+        "graph": graph.graph,
+        "vehicle_groups": [group for group, _ in groups_with_weights],
+        "confidence_scores": confidence_scores
+    }
 
 
-# def build_vehicle_network(df: pd.DataFrame, vehicle_groups: List[List[str]], confidence_scores: Dict[int, float]) -> Dict[str, Any]:
-#     """
-#     Build a network of vehicle movements using the identified vehicle groups.
-#     This function creates a TPMSNetwork to track vehicle paths and generates summary statistics.
+def build_vehicle_network(df: pd.DataFrame, vehicle_groups: List[List[str]], confidence_scores: Dict[int, float]) -> Dict[str, Any]:
+    """
+    Build a network of vehicle movements using the identified vehicle groups.
+    This function creates a TPMSNetwork to track vehicle paths and generates summary statistics.
     
-#     Parameters:
-#         df: Pandas DataFrame containing the TPMS readings
-#         vehicle_groups: List of lists, where each inner list contains TPMS IDs for a vehicle
-#         confidence_scores: Dictionary mapping group index to confidence score
+    Parameters:
+        df: Pandas DataFrame containing the TPMS readings
+        vehicle_groups: List of lists, where each inner list contains TPMS IDs for a vehicle
+        confidence_scores: Dictionary mapping group index to confidence score
         
-#     Returns:
-#         Dictionary with network, vehicle data, and statistics
-#     """
-#     # Ensure required columns exist
-#     required_columns = ['timestamp', 'tpms_id', 'location', 'latitude', 'longitude']
-#     missing_columns = [col for col in required_columns if col not in df.columns]
+    Returns:
+        Dictionary with network, vehicle data, and statistics
+    """
+    # Ensure required columns exist
+    required_columns = ['timestamp', 'tpms_id', 'location', 'latitude', 'longitude']
+    missing_columns = [col for col in required_columns if col not in df.columns]
     
-#     if missing_columns:
-#         raise ValueError(f"DataFrame is missing required columns: {', '.join(missing_columns)}")
+    if missing_columns:
+        raise ValueError(f"DataFrame is missing required columns: {', '.join(missing_columns)}")
     
-#     # Convert timestamp to datetime if it's not already
-#     if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
-#         df['timestamp'] = df['timestamp'].apply(parse_timestamp)
+    df = df.copy()
+    # Convert timestamp and coordinates if they are not already parsed
+    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['latitude'] = pd.to_numeric(df['latitude'])
+    df['longitude'] = pd.to_numeric(df['longitude'])
     
-#     # Handle missing optional columns
-#     if 'tpms_model' not in df.columns:
-#         df['tpms_model'] = 'unknown'
-#     if 'car_model' not in df.columns:
-#         df['car_model'] = 'unknown'
-#     if 'signal_strength' not in df.columns:
-#         df['signal_strength'] = 0.0
+    # Handle missing optional columns
+    if 'tpms_model' not in df.columns:
+        df['tpms_model'] = 'unknown'
+    if 'car_model' not in df.columns:
+        df['car_model'] = 'unknown'
+    if 'signal_strength' not in df.columns:
+        df['signal_strength'] = 0.0
     
-#     # Create TPMSNetwork to track movement paths
-#     network = TPMSNetwork()
+    # Create TPMSNetwork to track movement paths
+    network = TPMSNetwork()
     
-#     # Group TPMS readings by timestamp and location to find co-occurring sensor events
-#     for vehicle_idx, group in enumerate(vehicle_groups):
-#         # Get confidence score for this group
-#         confidence = confidence_scores.get(vehicle_idx, 0)
+    # Group TPMS readings by timestamp and location to find co-occurring sensor events
+    for vehicle_idx, group in enumerate(vehicle_groups):
+        # Get confidence score for this group
+        confidence = confidence_scores.get(vehicle_idx, 0)
         
-#         # Filter data for this vehicle's sensors
-#         vehicle_data = df[df['tpms_id'].isin(group)]
+        # Filter data for this vehicle's sensors, grouping by approximate timestamp
+        # (rounded to nearest 5 seconds)
+        vehicle_data = df[df['tpms_id'].isin(group)]
+        if vehicle_data.empty:
+            continue
+        vehicle_data = vehicle_data.assign(timestamp_rounded=vehicle_data['timestamp'].dt.round('5s'))
         
-#         # Skip if no data for this group
-#         if vehicle_data.empty:
-#             continue
+        # Group by timestamp and location to find when all sensors were detected together
+        grouped_events = vehicle_data.groupby(['timestamp_rounded', 'location'], observed=True)
         
-#         # Group by approximate timestamp (rounded to nearest 5 seconds)
-#         vehicle_data['timestamp_rounded'] = vehicle_data['timestamp'].dt.round('5S')
-        
-#         # Group by timestamp and location to find when all sensors were detected together
-#         grouped_events = vehicle_data.groupby(['timestamp_rounded', 'location'])
-        
-#         for (timestamp, location), event_data in grouped_events:
-#             # Check if we have at least 2 sensors in this group (more likely to be a valid detection)
-#             if len(event_data) >= 2:
-#                 # Get representative data for this event
-#                 lat = event_data['latitude'].mean()
-#                 lon = event_data['longitude'].mean()
-#                 signal = event_data['signal_strength'].mean() if 'signal_strength' in event_data else 0
-#                 battery = event_data.get('battery', [0]).mean() if 'battery' in event_data else 0
-                
-#                 # Get list of tire IDs for this event
-#                 tire_ids = event_data['tpms_id'].tolist()
-                
-#                 # Add event to network
-#                 network.add_event(
-#                     timestamp=timestamp,
-#                     location=location,
-#                     latitude=lat,
-#                     longitude=lon,
-#                     battery=battery,
-#                     signal_strength=signal,
-#                     tire_ids=tire_ids,
-#                     car_description=f"Vehicle Group {vehicle_idx+1} (Confidence: {confidence:.1f}%)"
-#                 )
+        for (timestamp, location), event_data in grouped_events:
+            # Check if we have at least 2 sensors in this group (more likely to be a valid detection)
+            if len(event_data) < 2:
+                continue
+            network.add_event(
+                timestamp=timestamp.to_pydatetime(),
+                location=location,
+                latitude=float(event_data['latitude'].mean()),
+                longitude=float(event_data['longitude'].mean()),
+                battery=float(event_data['battery'].mean()) if 'battery' in event_data else 0.0,
+                signal_strength=float(event_data['signal_strength'].mean()),
+                tire_ids=event_data['tpms_id'].tolist(),
+                car_description=f"Vehicle Group {vehicle_idx+1} (Confidence: {confidence * 100:.1f}%)",
+                tire_model=event_data['tpms_model'].mode().iloc[0]
+            )
     
-#     # Extract summary statistics
-#     stats = {
-#         "total_readings": len(df),
-#         "unique_sensors": df['tpms_id'].nunique(),
-#         "vehicle_groups": len(vehicle_groups),
-#         "locations": df['location'].nunique(),
-#         "time_range": {
-#             "start": df['timestamp'].min().isoformat(),
-#             "end": df['timestamp'].max().isoformat()
-#         }
-#     }
+    # Extract summary statistics
+    stats = {
+        "total_readings": len(df),
+        "unique_sensors": int(df['tpms_id'].nunique()),
+        "vehicle_groups": len(vehicle_groups),
+        "locations": int(df['location'].nunique()),
+        "time_range": {
+            "start": df['timestamp'].min().isoformat() if len(df) else None,
+            "end": df['timestamp'].max().isoformat() if len(df) else None
+        }
+    }
     
-#     # Prepare vehicle group data for frontend
-#     vehicles_data = []
-#     for i, group in enumerate(vehicle_groups):
-#         confidence = confidence_scores.get(i, 0)
-        
-#         # Get sample readings for this group
-#         group_readings = df[df['tpms_id'].isin(group)].sort_values('timestamp')
-        
-#         # Skip if no readings
-#         if group_readings.empty:
-#             continue
+    # Prepare vehicle group data for frontend
+    vehicles_data = []
+    for i, group in enumerate(vehicle_groups):
+        group_readings = df[df['tpms_id'].isin(group)].sort_values('timestamp')
+        if group_readings.empty:
+            continue
         
-#         # Extract model information if available
-#         tpms_models = group_readings['tpms_model'].unique().tolist() if 'tpms_model' in group_readings else []
-#         car_models = group_readings['car_model'].unique().tolist() if 'car_model' in group_readings else []
+        # Use first tire ID to get the path
+        path = network.get_path_by_tire(group[0])
         
-#         # Get path information
-#         if len(group) > 0:
-#             # Use first tire ID to get the path
-#             path = network.get_path_by_tire(group[0])
-#             path_details = network.get_path_details(path)
-#         else:
-#             path_details = []
-        
-#         vehicles_data.append({
-#             "group_id": i,
-#             "tire_ids": group,
-#             "confidence": confidence,
-#             "tpms_models": tpms_models,
-#             "car_models": car_models,
-#             "detection_count": len(group_readings),
-#             "path": path_details
-#         })
-    
-#     # Return results
-#     return {
-#         "stats": stats,
-#         "vehicles": vehicles_data,
-#         "network": network.to_dict()
-#     }
-
-
-# # Example of how to use these functions in sequence:
-# def process_csv_data(df: pd.DataFrame) -> Dict[str, Any]:
-#     """
-#     Process the uploaded CSV data and run graph algorithms
-    
-#     Parameters:
-#         df: Pandas DataFrame containing the TPMS readings
-        
-#     Returns:
-#         Dictionary with processing results
-#     """
-#     # First, process the data to identify vehicle groups
-#     grouping_results = process_vehicle_groups(df)
-    
-#     # Then, build the network using the identified groups
-#     network_results = build_vehicle_network(
-#         df, 
-#         grouping_results["vehicle_groups"], 
-#         grouping_results["confidence_scores"]
-#     )
+        vehicles_data.append({
+            "group_id": i,
+            "tire_ids": group,
+            "confidence": confidence_scores.get(i, 0),
+            "tpms_models": group_readings['tpms_model'].unique().tolist(),
+            "car_models": group_readings['car_model'].unique().tolist(),
+            "detection_count": len(group_readings),
+            "path": network.get_path_details(path)
+        })
     
-#     # You can also include the graph in the results if needed
-#     network_results["graph"] = grouping_results["graph"]
-    
-#     return network_results
+    return {
+        "stats": stats,
+        "vehicles": vehicles_data,
+        "network": network.to_dict()
+    }
 
 
-# # Example of how to filter data before grouping:
-# def process_filtered_data(df: pd.DataFrame, filter_model: str = None, filter_tpms_id: str = None) -> Dict[str, Any]:
-#     """
-#     Filter data for a specific model or TPMS ID, then process it
+def process_csv_data(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Run vehicle grouping over uploaded CSV data and build the resulting movement network.
     
-#     Parameters:
-#         df: Pandas DataFrame containing the TPMS readings
-#         filter_model: Optional model name to filter by
-#         filter_tpms_id: Optional TPMS ID to filter by
+    Parameters:
+        df: Pandas DataFrame containing the TPMS readings
         
-#     Returns:
-#         Dictionary with processing results
-#     """
-#     # Apply filters if provided
-#     filtered_df = df.copy()
-    
-#     if filter_model and 'tpms_model' in df.columns:
-#         filtered_df = filtered_df[filtered_df['tpms_model'] == filter_model]
-    
-#     if filter_tpms_id:
-#         # If filtering by a specific TPMS ID, we might want to include other sensors 
-#         # from the same vehicle, but we don't know which ones yet
-#         # For now, just filter by the ID
-#         filtered_df = filtered_df[filtered_df['tpms_id'] == filter_tpms_id]
-    
-#     # Check if we have enough data after filtering
-#     if len(filtered_df) < 10:
-#         raise ValueError("Not enough data after filtering")
+    Returns:
+        Dictionary with stats, vehicle groups and the serialized network
+    """
+    # First, process the data to identify vehicle groups
+    grouping_results = process_vehicle_groups(df)
     
-#     # Process the filtered data
-#     grouping_results = process_vehicle_groups(filtered_df)
-    
-#     # Build network using the original dataframe but only for the identified groups
-#     # This way we include all the data for the identified vehicles
-#     network_results = build_vehicle_network(
-#         df,  # Use full dataset
-#         grouping_results["vehicle_groups"], 
-#         grouping_results["confidence_scores"]
-#     )
-    
-#     # Include the graph in the results
-#     network_results["graph"] = grouping_results["graph"]
-    
-#     return network_results
+    # Then, build the network using the identified groups
+    return build_vehicle_network(
+        df, 
+        grouping_results["vehicle_groups"], 
+        grouping_results["confidence_scores"]
+    )
+
+
+def run_csv_ingest(job, path: str, batch_size: int, group_vehicles: bool, dedupe: bool = False) -> Dict[str, Any]:
+    """
+    Background body of an upload job: stream the spooled CSV at `path` into the
+    database, then optionally run vehicle grouping over its valid rows. The spooled file is
+    removed once the job finishes.
+    """
+    try:
+        # Grouping runs over the validated rows only, so a rejected row cannot fail it.
+        clean_rows: Optional[List[Dict[str, Any]]] = [] if group_vehicles else None
+        with open(path, "rb") as f, closing(iter_csv_chunks(f, chunk_size=batch_size)) as chunks, \
+                SessionLocal() as db:
+            stats = bulk_insert_detections(
+                validated_detection_rows(chunks, job.report, collect=clean_rows), db,
+                batch_size=batch_size, on_batch=job.record_progress, dedupe=dedupe
+            )
+        stats["rows_rejected"] = job.report.rows_rejected
+        results: Dict[str, Any] = {"stats": stats, "errors": job.report.to_dict()}
+
+        if group_vehicles:
+            results["vehicles"] = []
+            results["network"] = None
+            if clean_rows:
+                grouping = process_csv_data(pd.DataFrame.from_records(clean_rows, columns=GROUPING_COLUMNS))
+                results["stats"] = {**stats, **grouping["stats"]}
+                results["vehicles"] = grouping["vehicles"]
+                results["network"] = grouping["network"]
+        return results
+    finally:
+        os.remove(path)
@@ -0,0 +1,137 @@
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List
+import numpy as np
+import pandas as pd
+from config import UPLOAD_ERROR_SAMPLE_LIMIT
+from utils.geo import geo_cells
+
+# Columns that may be missing from an upload and the value used in their place.
+STRING_COLUMNS = ["tpms_id", "tpms_model", "car_model", "location"]
+COORDINATE_DEFAULT = 0.0
+
+
+class ValidationReport:
+    def __init__(self, sample_limit: int = UPLOAD_ERROR_SAMPLE_LIMIT):
+        """
+        Compact record of rows rejected during ingest: a count per reason plus the
+        first `sample_limit` offending rows.
+        """
+        self.sample_limit = sample_limit
+        self.rows_checked = 0
+        self.rows_rejected = 0
+        self.reasons: Counter = Counter()
+        self.samples: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, rows_checked: int, rejected: List[Dict[str, Any]]):
+        with self._lock:
+            self.rows_checked += rows_checked
+            self.rows_rejected += len(rejected)
+            self.reasons.update(r["reason"] for r in rejected)
+            room = self.sample_limit - len(self.samples)
+            if room > 0:
+                self.samples.extend(rejected[:room])
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows_checked": self.rows_checked,
+                "rows_rejected": self.rows_rejected,
+                "reasons": dict(self.reasons),
+                "samples": list(self.samples),
+            }
+
+
+def _parse_timestamps(values: pd.Series) -> pd.Series:
+    """
+    Parse ISO 8601 timestamps column-wise. Unparseable values become NaT and
+    timezone-aware values are normalised to naive UTC to match the detections table.
+    """
+    try:
+        parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    except ValueError:
+        # Mixed offsets (or offsets mixed with naive values) need a common zone.
+        parsed = pd.to_datetime(values, errors="coerce", format="ISO8601", utc=True)
+    if getattr(parsed.dt, "tz", None) is not None:
+        parsed = parsed.dt.tz_convert(None)
+    return parsed
+
+
+def validate_detection_chunk(chunk: pd.DataFrame, first_row: int, report: ValidationReport) -> List[Dict[str, Any]]:
+    """
+    Validate one CSV chunk column by column and return the clean rows as
+    column mappings for bulk_insert_detections.
+
+    Rejected rows are added to `report`, numbered from 1 for the first data row of
+    the file; `first_row` is the number of the first row in this chunk.
+    """
+    n = len(chunk)
+    if n == 0:
+        return []
+
+    if "timestamp" in chunk:
+        timestamps = _parse_timestamps(chunk["timestamp"])
+    else:
+        timestamps = pd.Series(pd.Timestamp(datetime.now()), index=chunk.index)
+    latitudes = pd.to_numeric(chunk["latitude"], errors="coerce") if "latitude" in chunk \
+        else pd.Series(COORDINATE_DEFAULT, index=chunk.index)
+    longitudes = pd.to_numeric(chunk["longitude"], errors="coerce") if "longitude" in chunk \
+        else pd.Series(COORDINATE_DEFAULT, index=chunk.index)
+    strings = {
+        col: chunk[col].fillna("").astype(str) if col in chunk else pd.Series("", index=chunk.index)
+        for col in STRING_COLUMNS
+    }
+    strings["tpms_id"] = strings["tpms_id"].str.strip()
+
+    # Evaluated in order; a row is reported under the first check it fails.
+    checks = [
+        ("invalid_timestamp", "timestamp", timestamps.isna().to_numpy()),
+        ("missing_tpms_id", "tpms_id", (strings["tpms_id"] == "").to_numpy()),
+        ("invalid_latitude", "latitude", ~latitudes.between(-90.0, 90.0).to_numpy()),
+        ("invalid_longitude", "longitude", ~longitudes.between(-180.0, 180.0).to_numpy()),
+    ]
+    bad = np.zeros(n, dtype=bool)
+    rejected = []
+    for reason, column, failed in checks:
+        new = failed & ~bad
+        if new.any():
+            values = chunk[column] if column in chunk else pd.Series(None, index=chunk.index)
+            for pos in np.flatnonzero(new):
+                value = values.iloc[pos]
+                rejected.append({
+                    "row": first_row + int(pos),
+                    "reason": reason,
+                    "value": None if pd.isna(value) else str(value),
+                })
+            bad |= new
+    rejected.sort(key=lambda r: r["row"])
+    report.add(n, rejected)
+
+    good = ~bad
+    cells = geo_cells(latitudes[good].to_numpy(), longitudes[good].to_numpy()).tolist()
+    return [
+        {
+            "id": uuid.uuid4(),
+            "timestamp": timestamp,
+            "tpms_id": tpms_id,
+            "tpms_model": tpms_model,
+            "car_model": car_model,
+            "location": location,
+            "latitude": latitude,
+            "longitude": longitude,
+            "geo_cell": cell,
+        }
+        for timestamp, tpms_id, tpms_model, car_model, location, latitude, longitude, cell in zip(
+            timestamps[good].dt.to_pydatetime(),
+            strings["tpms_id"][good].tolist(),
+            strings["tpms_model"][good].tolist(),
+            strings["car_model"][good].tolist(),
+            strings["location"][good].tolist(),
+            latitudes[good].tolist(),
+            longitudes[good].tolist(),
+            cells,
+        )
+    ]
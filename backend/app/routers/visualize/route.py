@@ -6,8 +6,41 @@ import pandas as pd
 import networkx as nx
 from database import db  
 from DS import TPMSGraph, TPMSNetwork 
+from routers.upload.utils import iter_csv_chunks
+from utils.serialization import FastJSONResponse
+from config import UPLOAD_BATCH_SIZE
 
-visualize_router = APIRouter(prefix="/api/visualize", tags=["Visualize"])
+visualize_router = APIRouter(prefix="/api/visualize", tags=["Visualize"], default_response_class=FastJSONResponse)
+
+# Define the CSV columns we expect.
+CSV_COLUMNS = ["timestamp", "tpms_id", "tpms_model", "car_model", "location", "latitude", "longitude"]
+CATEGORICAL_COLUMNS = ["tpms_id", "tpms_model", "car_model", "location"]
+
+
+def stream_csv(file: UploadFile, usecols: List[str]):
+    """
+    Iterate over the uploaded CSV in chunks, rejecting files without the expected columns.
+    """
+    try:
+        yield from iter_csv_chunks(file.file, chunk_size=UPLOAD_BATCH_SIZE, usecols=usecols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Error reading CSV: {e}")
+
+
+def read_csv_frame(file: UploadFile, usecols: List[str]) -> pd.DataFrame:
+    """
+    Load the uploaded CSV chunk by chunk into one compact DataFrame.
+    """
+    frames = []
+    for chunk in stream_csv(file, usecols):
+        chunk["latitude"] = pd.to_numeric(chunk["latitude"], errors="coerce")
+        chunk["longitude"] = pd.to_numeric(chunk["longitude"], errors="coerce")
+        frames.append(chunk.astype({col: "category" for col in CATEGORICAL_COLUMNS}))
+    if not frames:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    df = pd.concat(frames, ignore_index=True)
+    # Chunks may have different category sets; unify them after concatenation.
+    return df.astype({col: "category" for col in CATEGORICAL_COLUMNS})
 
 @visualize_router.post("/graph", response_model=dict)
 def create_graph(
@@ -17,11 +50,9 @@ def create_graph(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are accepted")
     
-    # Read CSV into DataFrame; use only the desired columns.
-    df = pd.read_csv(
-        file.file,
-        usecols=["timestamp", "tpms_id", "tpms_model", "car_model", "location", "latitude", "longitude"]
-    )
+    # Stream the CSV in chunks, keeping only the desired columns. The co-occurrence
+    # graph needs the whole frame, so repeated strings are stored as categoricals.
+    df = read_csv_frame(file, CSV_COLUMNS)
     
     # Create TPMSGraph instance.
     graph_obj = TPMSGraph(df)
@@ -32,14 +63,11 @@ def create_graph(
     # Convert NetworkX graph to a serializable format.
     graph_data = nx.node_link_data(graph_obj.graph)
     
-    return {
+    return FastJSONResponse({
         "graph": graph_data,
         "vehicle_groups": vehicle_groups,
         "confidence_scores": confidence_scores
-    }
-
-# Define the CSV columns we expect.
-CSV_COLUMNS = ["timestamp", "tpms_id", "tpms_model", "car_model", "location", "latitude", "longitude"]
+    })
 
 @visualize_router.post("/network", response_model=dict)
 def create_network(
@@ -52,29 +80,33 @@ def create_network(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are accepted")
     
-    # Read CSV into DataFrame using only the desired columns.
-    df = pd.read_csv(file.file, usecols=CSV_COLUMNS)
-    
     # Create a new TPMSNetwork instance.
     detection_graph = TPMSNetwork()
 
-    # Iterate over rows and add events.
-    for _, row in df.iterrows():
+    # Stream the CSV in chunks and add events as rows arrive.
+    for chunk in stream_csv(file, CSV_COLUMNS):
         try:
-            event = {
-                "timestamp": pd.to_datetime(row["timestamp"]),
-                "location": row["location"],
-                "latitude": float(row["latitude"]),
-                "longitude": float(row["longitude"]),
-                "battery": 0.0,            # Default value since CSV doesn't provide battery.
-                "signal_strength": 0.0,      # Default value since CSV doesn't provide signal strength.
-                "tire_ids": [str(row["tpms_id"]).strip()],
-                "car_description": row["car_model"]
-            }
+            timestamps = pd.to_datetime(chunk["timestamp"])
+            latitudes = chunk["latitude"].astype(float)
+            longitudes = chunk["longitude"].astype(float)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Error parsing CSV row: {e}")
-        
-        detection_graph.add_event(**event)
+
+        for timestamp, latitude, longitude, location, tpms_id, tpms_model, car_model in zip(
+            timestamps, latitudes, longitudes,
+            chunk["location"], chunk["tpms_id"], chunk["tpms_model"], chunk["car_model"]
+        ):
+            detection_graph.add_event(
+                timestamp=timestamp.to_pydatetime(),
+                location=location,
+                latitude=latitude,
+                longitude=longitude,
+                battery=0.0,            # Default value since CSV doesn't provide battery.
+                signal_strength=0.0,      # Default value since CSV doesn't provide signal strength.
+                tire_ids=[tpms_id.strip()],
+                car_description=car_model,
+                tire_model=tpms_model
+            )
 
     tire_detected_by_id = None
     tire_detected_by_model = None  # This remains optional.
@@ -93,12 +125,12 @@ def create_network(
     if node_path:
         coordinates = detection_graph.get_path_coordinates(node_path)
     
-    return {
+    return FastJSONResponse({
         "tire_detected_by_id": tire_detected_by_id,
         "tire_detected_by_model": tire_detected_by_model,
         "node_path": node_path,
         "path_node_coordinates": coordinates
-    }
+    })
 
 # get the coordinates of the path
 @visualize_router.get("/path/coordinates", response_model=dict)
@@ -0,0 +1,7 @@
+from typing import List
+from pydantic import BaseModel
+from pydantic import Field
+
+class IdSearchRequest(BaseModel):
+    ids: List[str] = Field(..., example=["TPMS123", "TPMS456"])
+    summary: bool = Field(False, description="Return only timestamp, location, latitude and longitude.")
@@ -1,3 +1,5 @@
 from . import auth_utils
+from . import serialization
+from . import geo
 
-__all__ = ["auth_utils"]    
\ No newline at end of file
+__all__ = ["auth_utils", "serialization", "geo"]    
\ No newline at end of file
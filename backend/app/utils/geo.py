@@ -0,0 +1,54 @@
+"""
+geo.py
+
+Fixed-size latitude/longitude grid used to bucket detections spatially.
+
+Every detection stores the integer id of the grid cell containing it
+(`Detection.geo_cell`). Cells are numbered row by row from the south-west corner, so
+the cells of one grid row that fall inside a bounding box form a contiguous id range
+and a viewport turns into a handful of indexed BETWEEN scans.
+
+CELL_DEGREES must not change once data is stored without recomputing every geo_cell.
+"""
+
+import math
+from typing import List, Tuple
+import numpy as np
+
+# 0.01 degrees is roughly 1.1 km north-south and 0.8 km east-west around Boston.
+CELL_DEGREES = 0.01
+CELLS_PER_ROW = math.ceil(360 / CELL_DEGREES)
+
+
+def geo_cell(latitude: float, longitude: float) -> int:
+    """
+    Return the id of the grid cell containing (latitude, longitude).
+    """
+    row = math.floor((latitude + 90.0) / CELL_DEGREES)
+    col = min(math.floor((longitude + 180.0) / CELL_DEGREES), CELLS_PER_ROW - 1)
+    return row * CELLS_PER_ROW + col
+
+
+def geo_cells(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Vectorized geo_cell for arrays of coordinates.
+    """
+    rows = np.floor((np.asarray(latitudes, dtype=float) + 90.0) / CELL_DEGREES).astype(np.int64)
+    cols = np.floor((np.asarray(longitudes, dtype=float) + 180.0) / CELL_DEGREES).astype(np.int64)
+    cols = np.minimum(cols, CELLS_PER_ROW - 1)
+    return rows * CELLS_PER_ROW + cols
+
+
+def cell_ranges_for_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Tuple[int, int]]:
+    """
+    Return inclusive (first, last) cell id ranges covering the bounding box, one per
+    grid row it spans.
+    """
+    first = geo_cell(min_lat, min_lon)
+    last = geo_cell(max_lat, max_lon)
+    first_row, first_col = divmod(first, CELLS_PER_ROW)
+    last_row, last_col = divmod(last, CELLS_PER_ROW)
+    return [
+        (row * CELLS_PER_ROW + first_col, row * CELLS_PER_ROW + last_col)
+        for row in range(first_row, last_row + 1)
+    ]
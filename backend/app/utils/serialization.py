@@ -0,0 +1,38 @@
+from typing import Any, Dict, Iterable, List, Sequence
+import orjson
+from fastapi.responses import JSONResponse
+from models.models import Detection
+
+DETECTION_FIELDS = ["id", "timestamp", "tpms_id", "tpms_model", "car_model", "location", "latitude", "longitude"]
+DETECTION_COLUMNS = [getattr(Detection, f) for f in DETECTION_FIELDS]
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, which encodes UUIDs, datetimes and numpy
+    values natively. Returning it from an endpoint skips FastAPI's jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def detection_columns(fields: Sequence[str] = DETECTION_FIELDS) -> List[Any]:
+    """
+    Return the Detection columns for `fields`, for use in a column-only query.
+    """
+    return [getattr(Detection, f) for f in fields]
+
+
+def rows_to_dicts(rows: Iterable[Sequence[Any]], fields: Sequence[str] = DETECTION_FIELDS) -> List[Dict[str, Any]]:
+    """
+    Convert row tuples from a column-only query into dictionaries keyed by `fields`.
+    """
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def dumps_ndjson(rows: Iterable[Sequence[Any]], fields: Sequence[str] = DETECTION_FIELDS) -> bytes:
+    """
+    Encode row tuples as newline-delimited JSON objects.
+    """
+    return b"".join(orjson.dumps(dict(zip(fields, row))) + b"\n" for row in rows)
@@ -0,0 +1,20 @@
+"""
+timestamps.py
+
+Detections are stored with naive UTC timestamps. Values arriving with a timezone are
+normalised here before they reach the database or any in-memory index, where aware
+and naive datetimes cannot be compared.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def to_naive_utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    """
+    Return `timestamp` converted to UTC without tzinfo; naive values and None are
+    returned unchanged.
+    """
+    if timestamp is None or timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,88 @@
+"""
+bench_compact_network.py
+
+Compare the networkx-backed TPMSNetwork with the array-backed CompactTPMSNetwork:
+build time, memory held after building (measured with tracemalloc in a second,
+untimed build) and the time of search_by_tire + get_path_for_node +
+get_path_details lookups.
+
+TPMSNetwork is measured on --events; CompactTPMSNetwork additionally on
+--compact-events to show it scales to tens of millions of events.
+
+Usage (from the backend directory):
+    python benchmarks/bench_compact_network.py --events 500000 --compact-events 10000000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_network_build import APP_DIR, build, generate
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=500_000, help="Events built with both implementations.")
+    parser.add_argument("--compact-events", type=int, default=0, help="Events built with CompactTPMSNetwork only.")
+    parser.add_argument("--sensors", type=int, default=10_000, help="Distinct tire ids; fewer means longer chains.")
+    parser.add_argument("--late", type=float, default=0.01, help="Share of events arriving out of order.")
+    parser.add_argument("--lookups", type=int, default=1_000, help="Tire path lookups to time.")
+    return parser.parse_args()
+
+
+def measure_memory(network_class, events) -> int:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    network, _ = build(network_class, events)
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del network
+    return memory
+
+
+def lookups(network, sensors: int, count: int) -> float:
+    rng = random.Random(7)
+    started = time.perf_counter()
+    for _ in range(count):
+        nodes = network.search_by_tire(f"TPMS_{rng.randrange(sensors):06d}")
+        if nodes:
+            network.get_path_details(network.get_path_for_node(nodes[-1]))
+    return time.perf_counter() - started
+
+
+def report(name, events, elapsed, memory, lookup_time, lookup_count):
+    print(
+        f"{name:<22}{events:>11}{elapsed:>11.2f}{elapsed / events * 1e6:>10.1f}"
+        f"{memory / 2**20:>11.1f}{memory / events:>10.0f}{lookup_time / lookup_count * 1e3:>12.3f}"
+    )
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, APP_DIR)
+    from DS import TPMSNetwork, CompactTPMSNetwork
+
+    print(f"Generating {max(args.events, args.compact_events)} events...")
+    events = generate(max(args.events, args.compact_events), args.sensors, args.late)
+
+    print(f"\n{'implementation':<22}{'events':>11}{'build (s)':>11}{'us/event':>10}"
+          f"{'memory MB':>11}{'B/event':>10}{'lookup ms':>12}")
+    runs = [(TPMSNetwork, args.events), (CompactTPMSNetwork, args.events)]
+    if args.compact_events:
+        runs.append((CompactTPMSNetwork, args.compact_events))
+    for network_class, count in runs:
+        network, elapsed = build(network_class, events[:count])
+        lookup_time = lookups(network, args.sensors, args.lookups)
+        del network
+        memory = measure_memory(network_class, events[:count])
+        report(network_class.__name__, count, elapsed, memory, lookup_time, args.lookups)
+
+
+if __name__ == "__main__":
+    main()
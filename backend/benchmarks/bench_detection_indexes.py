@@ -0,0 +1,175 @@
+"""
+bench_detection_indexes.py
+
+Measure search query latency on the detections table with and without the indexes
+created by database.migrations.
+
+The target database is filled with synthetic detections, the managed indexes are
+dropped, every query is timed, the indexes are rebuilt through the migration
+functions and every query is timed again. Point it at a scratch database only: it
+drops indexes and writes rows.
+
+Usage (from the backend directory):
+    python benchmarks/bench_detection_indexes.py --database-url postgresql://.../bench --rows 10000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+# Every secondary index the migrations manage, so the "before" run has none of them.
+MANAGED_INDEXES = [
+    "ix_detections_tpms_id_timestamp",
+    "ix_detections_timestamp_id",
+    "ix_detections_geo_cell_timestamp",
+    "ix_detections_tpms_model_timestamp",
+    "ix_detections_car_model_timestamp",
+]
+LOCATIONS = ["LoRa_Downtown", "LoRa_BackBay", "LoRa_Allston", "LoRa_Somerville", "LoRa_Cambridge"]
+START = datetime(2023, 6, 15)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="Scratch database to benchmark against.")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Rows to make sure the table holds.")
+    parser.add_argument("--sensors", type=int, default=200_000, help="Distinct tpms_ids in generated data.")
+    parser.add_argument("--models", type=int, default=500, help="Distinct tpms_models in generated data.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the median is reported.")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    return parser.parse_args()
+
+
+def populate(engine, Detection, rows: int, sensors: int, models: int, batch_size: int):
+    from sqlalchemy import func, insert, select
+    from utils.geo import geo_cell
+
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(Detection)).scalar()
+    missing = rows - existing
+    if missing <= 0:
+        print(f"Table already holds {existing} rows.")
+        return
+
+    print(f"Inserting {missing} synthetic detections...")
+    rng = random.Random(42)
+    span = 30 * 24 * 3600
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, missing, batch_size):
+            batch = []
+            for _ in range(min(batch_size, missing - offset)):
+                sensor = rng.randrange(sensors)
+                latitude = 42.30 + rng.random() * 0.1
+                longitude = -71.15 + rng.random() * 0.1
+                batch.append({
+                    "id": uuid.uuid4(),
+                    "timestamp": START + timedelta(seconds=rng.randrange(span)),
+                    "tpms_id": f"TPMS_{sensor:07d}",
+                    "tpms_model": f"Model-{sensor % models:04d}",
+                    "car_model": f"Car-{sensor % 97:02d}",
+                    "location": LOCATIONS[sensor % len(LOCATIONS)],
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "geo_cell": geo_cell(latitude, longitude),
+                })
+            conn.execute(insert(Detection), batch)
+    print(f"Inserted in {time.perf_counter() - started:.1f}s.")
+
+
+def queries(Detection):
+    from sqlalchemy import or_, select
+    from utils.geo import cell_ranges_for_bbox
+
+    window_start = START + timedelta(days=10)
+    area = select(Detection.id).where(
+        or_(*(Detection.geo_cell.between(first, last)
+              for first, last in cell_ranges_for_bbox(42.351, -71.101, 42.356, -71.096))),
+        Detection.latitude.between(42.351, 42.356),
+        Detection.longitude.between(-71.101, -71.096),
+    )
+    return {
+        "tpms_id =": select(Detection.id).where(Detection.tpms_id == "TPMS_0012345"),
+        "tpms_id IN (4)": select(Detection.id).where(
+            Detection.tpms_id.in_(["TPMS_0012345", "TPMS_0054321", "TPMS_0100000", "TPMS_0150000"])
+        ),
+        "tpms_id + time range": select(Detection.id).where(
+            Detection.tpms_id == "TPMS_0012345",
+            Detection.timestamp.between(window_start, window_start + timedelta(days=5)),
+        ),
+        "time range (1 min)": select(Detection.id).where(
+            Detection.timestamp.between(window_start, window_start + timedelta(minutes=1))
+        ),
+        "latest 3": select(Detection.id).order_by(Detection.timestamp.desc()).limit(3),
+        # Model search resolves a substring to exact names first, then filters with IN.
+        "tpms_model IN (10)": select(Detection.id).where(
+            Detection.tpms_model.in_([f"Model-{n:04d}" for n in range(120, 130)])
+        ),
+        "tpms_model + 1 day": select(Detection.id).where(
+            Detection.tpms_model == "Model-0120",
+            Detection.timestamp.between(window_start, window_start + timedelta(days=1)),
+        ),
+        "car_model =": select(Detection.id).where(Detection.car_model == "Car-42"),
+        # Like /api/search/area: first 1000 matches in time order.
+        "area (0.005 deg box)": area.order_by(Detection.timestamp).limit(1000),
+        "area + 1 day": area.where(
+            Detection.timestamp.between(window_start, window_start + timedelta(days=1))
+        ).order_by(Detection.timestamp).limit(1000),
+    }
+
+
+def time_queries(engine, Detection, repeat: int):
+    results = {}
+    with engine.connect() as conn:
+        for name, statement in queries(Detection).items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(statement).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    args = parse_args()
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, APP_DIR)
+
+    from database.db import Base, engine
+    from database import migrations
+    from models.models import Detection
+
+    Base.metadata.create_all(bind=engine)
+    populate(engine, Detection, args.rows, args.sensors, args.models, args.batch_size)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in MANAGED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("ANALYZE detections")
+    before = time_queries(engine, Detection, args.repeat)
+
+    started = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        migrations.rebuild_invalid_indexes(conn)
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("ANALYZE detections")
+    print(f"Built indexes in {time.perf_counter() - started:.1f}s.")
+    after = time_queries(engine, Detection, args.repeat)
+
+    print(f"\n{'query':<24}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] > 0 else float("inf")
+        print(f"{name:<24}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+bench_network_build.py
+
+Measure how long TPMSNetwork takes to build from synthetic detection events, the
+work background_tasks.update_tpms_network repeats on every refresh.
+
+Events are generated in timestamp order with a configurable share of late
+(out-of-order) arrivals. The network is built for a series of growing prefixes,
+so near-constant per-event cost shows up as a flat "us/event" column.
+
+Usage (from the backend directory):
+    python benchmarks/bench_network_build.py --events 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+LOCATIONS = ["LoRa_Downtown", "LoRa_BackBay", "LoRa_Allston", "LoRa_Somerville", "LoRa_Cambridge"]
+START = datetime(2023, 6, 15)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000, help="Events in the largest build.")
+    parser.add_argument("--sensors", type=int, default=1_000, help="Distinct tire ids; fewer means longer chains.")
+    parser.add_argument("--late", type=float, default=0.01, help="Share of events arriving out of order.")
+    parser.add_argument("--steps", type=int, default=4, help="Number of prefix sizes to build, halving each time.")
+    return parser.parse_args()
+
+
+def generate(count: int, sensors: int, late: float):
+    rng = random.Random(42)
+    events = []
+    for i in range(count):
+        timestamp = START + timedelta(seconds=i)
+        if rng.random() < late:
+            timestamp -= timedelta(seconds=rng.randrange(1, 3600))
+        sensor = rng.randrange(sensors)
+        location = LOCATIONS[sensor % len(LOCATIONS)]
+        events.append((timestamp, location, 42.3 + rng.random() * 0.1, -71.1 + rng.random() * 0.1, f"TPMS_{sensor:06d}"))
+    return events
+
+
+def build(TPMSNetwork, events):
+    network = TPMSNetwork()
+    started = time.perf_counter()
+    for timestamp, location, latitude, longitude, tire_id in events:
+        network.add_event(
+            timestamp=timestamp,
+            location=location,
+            latitude=latitude,
+            longitude=longitude,
+            battery=100.0,
+            signal_strength=0.0,
+            tire_ids=[tire_id],
+        )
+    return network, time.perf_counter() - started
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, APP_DIR)
+    from DS import TPMSNetwork
+
+    print(f"Generating {args.events} events...")
+    events = generate(args.events, args.sensors, args.late)
+    sizes = sorted({max(1, args.events >> step) for step in range(args.steps)})
+
+    print(f"\n{'events':>10}{'build (s)':>12}{'us/event':>10}{'edges':>10}")
+    for size in sizes:
+        network, elapsed = build(TPMSNetwork, events[:size])
+        print(f"{size:>10}{elapsed:>12.2f}{elapsed / size * 1e6:>10.1f}{network.graph.number_of_edges():>10}")
+        del network
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+bench_network_snapshot.py
+
+Measure TPMSNetwork cold-start options on synthetic events:
+
+    rebuild   add_event for every event (what a full refresh does, without the
+              database read)
+    dict      to_dict / from_dict, with the dict written as JSON for its size
+    snapshot  save_snapshot / load_snapshot
+
+Usage (from the backend directory):
+    python benchmarks/bench_network_snapshot.py --events 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_network_build import APP_DIR, build, generate
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000, help="Events in the network.")
+    parser.add_argument("--sensors", type=int, default=10_000, help="Distinct tire ids; fewer means longer chains.")
+    parser.add_argument("--late", type=float, default=0.01, help="Share of events arriving out of order.")
+    return parser.parse_args()
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, APP_DIR)
+    from DS import TPMSNetwork
+
+    print(f"Generating {args.events} events...")
+    events = generate(args.events, args.sensors, args.late)
+    network, rebuild_time = build(TPMSNetwork, events)
+    del events
+
+    data, to_dict_time = timed(network.to_dict)
+    dict_size = len(json.dumps(data, default=str))
+    restored, from_dict_time = timed(TPMSNetwork.from_dict, data)
+    del data, restored
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "network.snapshot")
+        snapshot_size, save_time = timed(network.save_snapshot, path, {"events": args.events})
+        (restored, _), load_time = timed(TPMSNetwork.load_snapshot, path)
+    assert restored.graph.number_of_edges() == network.graph.number_of_edges()
+
+    print(f"\n{'method':<10}{'write (s)':>11}{'load (s)':>10}{'size MB':>10}")
+    print(f"{'rebuild':<10}{'':>11}{rebuild_time:>10.2f}{'':>10}")
+    print(f"{'dict':<10}{to_dict_time:>11.2f}{from_dict_time:>10.2f}{dict_size / 2**20:>10.1f}")
+    print(f"{'snapshot':<10}{save_time:>11.2f}{load_time:>10.2f}{snapshot_size / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+bench_readings_memory.py
+
+Compare the memory footprint and search latency of the two Readings backends:
+Readings (a list of __slots__ Detection objects plus per-field indexes) and
+ColumnarReadings (typed columns with integer-coded strings).
+
+Memory is measured with tracemalloc as the growth caused by building each
+container from the same synthetic detections. Searches are timed on the filled
+containers.
+
+Usage (from the backend directory):
+    python benchmarks/bench_readings_memory.py --detections 1000000
+"""
+
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+LOCATIONS = ["LoRa_Downtown", "LoRa_BackBay", "LoRa_Allston", "LoRa_Somerville", "LoRa_Cambridge"]
+START = datetime(2023, 6, 15)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detections", type=int, default=1_000_000, help="Detections to store.")
+    parser.add_argument("--sensors", type=int, default=50_000, help="Distinct tpms_ids in generated data.")
+    parser.add_argument("--models", type=int, default=200, help="Distinct tpms_models in generated data.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per search; the median is reported.")
+    return parser.parse_args()
+
+
+def generate(Detection, count: int, sensors: int, models: int):
+    rng = random.Random(42)
+    span = 30 * 24 * 3600
+    for _ in range(count):
+        sensor = rng.randrange(sensors)
+        # Fresh strings per detection, as they arrive from CSV parsing or the database.
+        yield Detection(
+            timestamp=START + timedelta(seconds=rng.randrange(span)),
+            tpms_id="TPMS_%07d" % sensor,
+            tpms_model="Model-%04d" % (sensor % models),
+            car_model="Car-%02d" % (sensor % 97),
+            location=LOCATIONS[sensor % len(LOCATIONS)],
+            latitude=42.30 + rng.random() * 0.1,
+            longitude=-71.15 + rng.random() * 0.1,
+            signal_strength=-40.0 - rng.random() * 50,
+        )
+
+
+def build(factory, Detection, args):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    readings = factory()
+    for detection in generate(Detection, args.detections, args.sensors, args.models):
+        readings.add(detection)
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return readings, size, elapsed
+
+
+def time_searches(readings, repeat: int):
+    queries = {
+        "tpms_id": {"tpms_id": "TPMS_0012345"},
+        "tpms_model": {"tpms_model": "Model-0042"},
+        "tpms_model + location": {"tpms_model": "Model-0042", "location": "LoRa_Allston"},
+    }
+    results = {}
+    for name, query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            readings.search(**query)
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, APP_DIR)
+    from DS import ColumnarReadings, Detection, Readings
+
+    rows = []
+    for name, factory in [("Readings", Readings), ("ColumnarReadings", ColumnarReadings)]:
+        readings, size, elapsed = build(factory, Detection, args)
+        searches = time_searches(readings, args.repeat)
+        rows.append((name, size, elapsed, searches))
+        del readings
+
+    print(f"{args.detections} detections, {args.sensors} sensors, {args.models} models\n")
+    print(f"{'backend':<18}{'memory (MB)':>13}{'bytes/det':>11}{'build (s)':>11}")
+    for name, size, elapsed, _ in rows:
+        print(f"{name:<18}{size / 2**20:>13.1f}{size / args.detections:>11.0f}{elapsed:>11.1f}")
+    print(f"\n{'search (ms)':<24}" + "".join(f"{name:>18}" for name, *_ in rows))
+    for query in rows[0][3]:
+        print(f"{query:<24}" + "".join(f"{searches[query]:>18.2f}" for *_, searches in rows))
+
+
+if __name__ == "__main__":
+    main()
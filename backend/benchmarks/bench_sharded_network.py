@@ -0,0 +1,87 @@
+"""
+bench_sharded_network.py
+
+Compare a monolithic TPMSNetwork with ShardedTPMSNetwork built sequentially and on
+a process pool, and time a location query over a one-shard window against the
+same query over the whole history.
+
+Events are one second apart, so 1M events span about 11.5 days.
+
+Usage (from the backend directory):
+    python benchmarks/bench_sharded_network.py --events 1000000 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_network_build import APP_DIR, LOCATIONS, build, generate
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000, help="Events in the network.")
+    parser.add_argument("--sensors", type=int, default=10_000, help="Distinct tire ids; fewer means longer chains.")
+    parser.add_argument("--late", type=float, default=0.01, help="Share of events with shifted timestamps.")
+    parser.add_argument("--shard-hours", type=int, default=24, help="Shard length.")
+    parser.add_argument("--workers", type=int, default=4, help="Processes for the parallel build.")
+    parser.add_argument("--queries", type=int, default=20, help="Queries to time.")
+    return parser.parse_args()
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, APP_DIR)
+    from DS import TPMSNetwork, ShardedTPMSNetwork
+
+    print(f"Generating {args.events} events...")
+    # Full rebuilds read detections in timestamp order.
+    generated = sorted(generate(args.events, args.sensors, args.late), key=lambda event: event[0])
+    events = [
+        (timestamp, location, latitude, longitude, 100.0, 0.0, [tire_id], "", None)
+        for timestamp, location, latitude, longitude, tire_id in generated
+    ]
+    shard_seconds = args.shard_hours * 3600
+
+    monolithic, monolithic_time = build(TPMSNetwork, generated)
+    del generated
+    sequential, sequential_time = timed(ShardedTPMSNetwork.build, events, shard_seconds)
+    parallel, parallel_time = timed(ShardedTPMSNetwork.build, events, shard_seconds, args.workers)
+    assert parallel.to_dict()["edges"] == sequential.to_dict()["edges"]
+
+    print(f"\n{'build':<34}{'seconds':>10}")
+    print(f"{'TPMSNetwork':<34}{monolithic_time:>10.2f}")
+    print(f"{'ShardedTPMSNetwork':<34}{sequential_time:>10.2f}")
+    print(f"{f'ShardedTPMSNetwork, {args.workers} workers':<34}{parallel_time:>10.2f}")
+    print(f"({len(sequential.shards)} shards, {len(sequential.boundary_links)} boundary links, "
+          f"{os.cpu_count()} CPUs)")
+
+    # The last shard's window, as a dashboard showing the latest day would ask for.
+    since = sequential.shard_start(sequential.shard_keys[-1])
+    until = since + timedelta(seconds=shard_seconds) - timedelta(microseconds=1)
+    query = {"location": LOCATIONS[0]}
+    rows = [
+        ("TPMSNetwork, all history", lambda: monolithic.search_event(query)),
+        ("ShardedTPMSNetwork, all history", lambda: sequential.search_event(query)),
+        ("ShardedTPMSNetwork, last shard", lambda: sequential.search_event(query, since, until)),
+    ]
+    print(f"\n{'search_event by location':<34}{'ms':>10}{'results':>10}")
+    for name, query_function in rows:
+        started = time.perf_counter()
+        for _ in range(args.queries):
+            results = query_function()
+        elapsed = (time.perf_counter() - started) / args.queries
+        print(f"{name:<34}{elapsed * 1e3:>10.2f}{len(results):>10}")
+
+
+if __name__ == "__main__":
+    main()
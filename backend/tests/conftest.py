@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+# Point the app at a throwaway SQLite database before anything imports config.
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'lantern-test.db')}"
+os.environ["NETWORK_SNAPSHOT_PATH"] = ""
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from database import db
+import models
+import background_tasks
+from routers.detection import detection_router
+from routers.upload.upload import upload_router
+
+
+@pytest.fixture
+def database():
+    """
+    Fresh detections tables and empty in-memory read models for one test.
+    """
+    db.Base.metadata.create_all(bind=db.engine)
+    background_tasks.latest_detections.reset([])
+    yield db
+    db.Base.metadata.drop_all(bind=db.engine)
+
+
+@pytest.fixture
+def client(database):
+    # Only the routers under test; main.app's startup hook would start background tasks.
+    app = FastAPI()
+    app.include_router(detection_router.router)
+    app.include_router(upload_router)
+    return TestClient(app)
@@ -0,0 +1,35 @@
+import uuid
+from datetime import datetime
+import background_tasks
+
+DETECTION = {
+    "tpms_id": "TPMS123",
+    "tpms_model": "ModelX",
+    "car_model": "Tesla Model 3",
+    "location": "Boston Downtown",
+    "latitude": 42.3564,
+    "longitude": -71.0622,
+}
+
+
+def test_create_detection_with_utc_offset_joins_naive_buffer(client, monkeypatch):
+    seeded = {**DETECTION, "id": uuid.uuid4(), "timestamp": datetime(2025, 3, 15, 12, 0, 0)}
+    background_tasks.latest_detections.reset([seeded])
+    monkeypatch.setattr(background_tasks, "network_watermark", (seeded["timestamp"], seeded["id"]))
+
+    response = client.post("/api/detection/", json={**DETECTION, "timestamp": "2025-03-15T14:34:56+02:00"})
+
+    assert response.status_code == 200, response.text
+    newest = background_tasks.latest_detections.latest()
+    assert [d["timestamp"] for d in newest] == [datetime(2025, 3, 15, 12, 34, 56), seeded["timestamp"]]
+
+
+def test_create_detection_with_z_timestamp(client):
+    background_tasks.latest_detections.reset(
+        [{**DETECTION, "id": uuid.uuid4(), "timestamp": datetime(2025, 3, 15, 12, 0, 0)}]
+    )
+
+    response = client.post("/api/detection/", json={**DETECTION, "timestamp": "2025-03-15T12:34:56Z"})
+
+    assert response.status_code == 200, response.text
+    assert background_tasks.latest_detections.latest(1)[0]["timestamp"] == datetime(2025, 3, 15, 12, 34, 56)
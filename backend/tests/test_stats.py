@@ -0,0 +1,23 @@
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import background_tasks
+from routers.stats import stats_router
+
+
+def test_location_hours_accept_utc_offsets(monkeypatch):
+    rollups = background_tasks.DetectionRollups()
+    rollups.rebuild([
+        (datetime(2025, 3, 15, 11, 30), "A1", "LoRa_Downtown", "ModelX"),
+        (datetime(2025, 3, 15, 12, 30), "A2", "LoRa_Downtown", "ModelX"),
+    ])
+    monkeypatch.setattr(stats_router, "detection_rollups", rollups)
+    app = FastAPI()
+    app.include_router(stats_router.stats_router)
+
+    response = TestClient(app).get(
+        "/api/stats/locations/hourly", params={"since": "2025-03-15T14:00:00+02:00", "until": "2025-03-15T12:59:00Z"}
+    )
+
+    assert response.status_code == 200, response.text
+    assert [bucket["hour"] for bucket in response.json()["buckets"]] == ["2025-03-15T12:00:00"]
@@ -0,0 +1,22 @@
+from routers.upload.jobs import IngestJob, IngestJobManager
+from routers.upload.utils import run_csv_ingest
+
+CSV_HEADER = "timestamp,tpms_id,tpms_model,car_model,location,latitude,longitude\n"
+
+
+def test_grouping_skips_rows_rejected_by_validation(database, tmp_path):
+    rows = [
+        f"2025-03-15T12:00:0{second},{tpms_id},Huf RDE046V21,Tesla Model 3,LoRa_Downtown,42.3564,-71.0622"
+        for second in range(3) for tpms_id in ("A1", "A2")
+    ]
+    rows.append("2025-03-15T12:00:05,A3,Huf RDE046V21,Tesla Model 3,LoRa_Downtown,abc,-71.0622")
+    path = tmp_path / "upload.csv"
+    path.write_text(CSV_HEADER + "\n".join(rows) + "\n")
+
+    job = IngestJob("upload.csv")
+    IngestJobManager(1, 1, 1)._run(job, run_csv_ingest, str(path), 100, True)
+
+    assert job.status == "completed", job.error
+    assert job.results["stats"]["rows_inserted"] == 6
+    assert job.results["stats"]["rows_rejected"] == 1
+    assert job.results["errors"]["reasons"] == {"invalid_latitude": 1}